@@ -5,27 +5,463 @@ Semantic analysis and evaluation of MLLM critiques
 """
 
 import os
+import re
 import json
+import hashlib
+import queue
+import threading
+from collections import OrderedDict
 import numpy as np
 import pandas as pd
 from typing import List, Dict, Any, Optional
-from sentence_transformers import SentenceTransformer
+from scipy import sparse
+from scipy.optimize import linear_sum_assignment, linprog
 from scipy.spatial.distance import cosine
-from scipy.stats import wasserstein_distance
+
+try:
+    from .cache import EmbeddingStore, open_embedding_store
+    from .retrieval import DEFAULT_INDEX_DIR, load_benchmark_index
+except ImportError:  # Executed as a script from src/
+    from cache import EmbeddingStore, open_embedding_store
+    from retrieval import DEFAULT_INDEX_DIR, load_benchmark_index
+
+DEFAULT_EMBEDDING_STORE = "outputs/cache/embeddings.sqlite"
+
+# Largest transport problem (n * m variables) solved exactly by linear programming
+EMD_EXACT_MAX_VARIABLES = 40000
+
+_models: Dict[str, Any] = {}
+_model_locks: Dict[str, threading.Lock] = {}
+_registry_lock = threading.Lock()
+
+
+def get_embedding_model(model_name: str = "BAAI/bge-large-zh-v1.5", warmup: bool = False):
+    """
+    Return the process-wide SentenceTransformer for a model, loading it on first use.
+    
+    Loading is serialized per model name, so concurrent callers wait for a
+    single load instead of each reading the weights from disk.
+    
+    Args:
+        model_name: Name of the sentence-transformers model
+        warmup: Run a dummy encode after loading (initializes CUDA kernels)
+        
+    Returns:
+        Shared SentenceTransformer instance
+    """
+    with _registry_lock:
+        if model_name in _models:
+            return _models[model_name]
+        lock = _model_locks.setdefault(model_name, threading.Lock())
+    
+    with lock:
+        if model_name not in _models:
+            from sentence_transformers import SentenceTransformer
+            model = SentenceTransformer(model_name)
+            if warmup:
+                model.encode(["warmup"], normalize_embeddings=True)
+            with _registry_lock:
+                _models[model_name] = model
+    return _models[model_name]
+
+
+def warmup_embedding_model(model_name: str = "BAAI/bge-large-zh-v1.5") -> threading.Thread:
+    """
+    Load and warm up an embedding model on a background thread.
+    
+    Args:
+        model_name: Name of the sentence-transformers model
+        
+    Returns:
+        The started daemon thread
+    """
+    thread = threading.Thread(
+        target=get_embedding_model,
+        args=(model_name, True),
+        name=f"warmup-{model_name}",
+        daemon=True
+    )
+    thread.start()
+    return thread
+
+
+def cosine_cost_matrix(embeddings1: np.ndarray, embeddings2: np.ndarray) -> np.ndarray:
+    """
+    Pairwise cosine distances between two embedding sets.
+    
+    Args:
+        embeddings1: Array of shape (n, dim)
+        embeddings2: Array of shape (m, dim)
+        
+    Returns:
+        Cost matrix of shape (n, m)
+    """
+    a = np.asarray(embeddings1, dtype=np.float64)
+    b = np.asarray(embeddings2, dtype=np.float64)
+    a = a / np.maximum(np.linalg.norm(a, axis=1, keepdims=True), 1e-12)
+    b = b / np.maximum(np.linalg.norm(b, axis=1, keepdims=True), 1e-12)
+    return np.clip(1.0 - a @ b.T, 0.0, 2.0)
+
+
+def _normalize_weights(weights: Optional[np.ndarray], n: int) -> np.ndarray:
+    """Return a probability vector (uniform when no weights are given)."""
+    if weights is None:
+        return np.full(n, 1.0 / n)
+    weights = np.asarray(weights, dtype=np.float64)
+    if weights.shape != (n,) or np.any(weights < 0) or weights.sum() <= 0:
+        raise ValueError(f"Weights must be {n} non-negative values with a positive sum")
+    return weights / weights.sum()
+
+
+def _emd_exact(cost: np.ndarray, a: np.ndarray, b: np.ndarray) -> float:
+    """Solve the transport problem exactly."""
+    n, m = cost.shape
+    if n == m and np.allclose(a, 1.0 / n) and np.allclose(b, 1.0 / m):
+        # Uniform equal-size sets: an optimal plan is a permutation
+        rows, cols = linear_sum_assignment(cost)
+        return float(cost[rows, cols].mean())
+    
+    # Sparse marginal constraints on the flattened (n * m) plan
+    index = np.arange(n * m)
+    a_eq = sparse.csr_matrix(
+        (np.ones(2 * n * m), (np.concatenate([index // m, n + index % m]), np.tile(index, 2))),
+        shape=(n + m, n * m)
+    )
+    result = linprog(
+        cost.ravel(),
+        A_eq=a_eq[:-1],  # One constraint is implied by equal total mass
+        b_eq=np.concatenate([a, b])[:-1],
+        bounds=(0, None),
+        method='highs'
+    )
+    if not result.success:
+        raise RuntimeError(f"EMD linear program failed: {result.message}")
+    return float(result.fun)
+
+
+def _emd_sinkhorn(
+    cost: np.ndarray,
+    a: np.ndarray,
+    b: np.ndarray,
+    reg: float = 0.01,
+    max_iter: int = 2000,
+    tol: float = 1e-6
+) -> float:
+    """Approximate the transport cost with entropic (Sinkhorn) scaling iterations."""
+    if reg < cost.max() / 600:
+        # exp(-cost / reg) would underflow float64
+        raise ValueError(f"Sinkhorn regularization {reg} is too small for this cost range")
+    kernel = np.exp(-cost / reg)
+    u = np.ones_like(a)
+    v = np.ones_like(b)
+    for i in range(max_iter):
+        u = a / np.maximum(kernel @ v, 1e-300)
+        v = b / np.maximum(kernel.T @ u, 1e-300)
+        # Column marginals are exact after the v update; check the rows
+        if i % 10 == 0 and np.abs(u * (kernel @ v) - a).sum() < tol:
+            break
+    return float(np.sum(u[:, None] * kernel * v[None, :] * cost))
+
+
+def earth_movers_distance(
+    embeddings1: np.ndarray,
+    embeddings2: np.ndarray,
+    weights1: Optional[np.ndarray] = None,
+    weights2: Optional[np.ndarray] = None,
+    method: str = "auto",
+    reg: float = 0.01
+) -> float:
+    """
+    Earth Mover's Distance between two weighted embedding sets under cosine cost.
+    
+    Args:
+        embeddings1: Array of shape (n, dim)
+        embeddings2: Array of shape (m, dim)
+        weights1: Optional mass per embedding in the first set (uniform if None)
+        weights2: Optional mass per embedding in the second set (uniform if None)
+        method: 'exact', 'sinkhorn', or 'auto' (exact up to EMD_EXACT_MAX_VARIABLES)
+        reg: Entropic regularization strength for Sinkhorn
+        
+    Returns:
+        Minimal transport cost (0 = identical distributions)
+    """
+    if method not in ("auto", "exact", "sinkhorn"):
+        raise ValueError(f"Unknown EMD method: {method}")
+    cost = cosine_cost_matrix(embeddings1, embeddings2)
+    a = _normalize_weights(weights1, cost.shape[0])
+    b = _normalize_weights(weights2, cost.shape[1])
+    
+    uniform_square = (
+        cost.shape[0] == cost.shape[1] and weights1 is None and weights2 is None
+    )
+    if method == "exact" or (
+        method == "auto" and (uniform_square or cost.size <= EMD_EXACT_MAX_VARIABLES)
+    ):
+        return _emd_exact(cost, a, b)
+    return _emd_sinkhorn(cost, a, b, reg)
+
+
+def critique_set_metrics(n: int, total: np.ndarray, sq_norm_sum: float) -> Dict[str, Any]:
+    """
+    Diversity, coherence and centroid of a critique set from sufficient statistics.
+    
+    Diversity is the mean pairwise cosine distance. For unit embeddings the
+    off-diagonal sum of the Gram matrix is |sum(e)|^2 - sum(|e|^2), and the
+    mean cosine similarity to the centroid c = sum(e)/n is |sum(e)|/n, so
+    neither metric needs the individual embeddings.
+    
+    Args:
+        n: Number of embeddings
+        total: Sum of the embeddings
+        sq_norm_sum: Sum of squared embedding norms
+        
+    Returns:
+        Dictionary with diversity, coherence and centroid
+    """
+    centroid = total / n if n else np.zeros_like(total)
+    total_sq = float(total @ total)
+    diversity = 1 - (total_sq - sq_norm_sum) / (n * (n - 1)) if n > 1 else 0
+    coherence = float(np.sqrt(total_sq) / n) if n and total_sq > 0 else 0.0
+    return {
+        'diversity': diversity,
+        'coherence': coherence,
+        'centroid': centroid
+    }
+
+
+class IncrementalAnalysis:
+    """
+    Running per-persona statistics for incremental corpus analysis.
+    
+    Each group keeps its count, embedding sum and sum of squared norms,
+    which is all ``critique_set_metrics`` needs; the global set is the sum
+    over groups. Analyzed items are tracked by job identity (painting,
+    persona, model) together with a hash of their critique, so each job is
+    counted once and a regenerated critique replaces its earlier version.
+    """
+    
+    def __init__(self, embedding_model: str):
+        """
+        Create empty statistics.
+        
+        Args:
+            embedding_model: Embedding model the statistics were computed with
+        """
+        self.embedding_model = embedding_model
+        self.groups: Dict[str, Dict[str, Any]] = {}
+        # item_key -> text_key of the critique currently counted for that job
+        self.seen: Dict[str, str] = {}
+    
+    @staticmethod
+    def item_key(group: str, result: Dict[str, Any]) -> str:
+        """
+        Hash identifying an evaluation job within a persona group.
+        
+        Results without an image path fall back to their critique text.
+        """
+        if result.get('image_path'):
+            identity = json.dumps(
+                [os.path.abspath(result['image_path']), result.get('model')], ensure_ascii=False
+            )
+        else:
+            identity = result['critique']
+        return hashlib.sha256(f"{group}\0{identity}".encode('utf-8')).hexdigest()
+    
+    @staticmethod
+    def text_key(critique: str) -> str:
+        """Hash of a critique text (the embedding store key)."""
+        return hashlib.sha256(critique.encode('utf-8')).hexdigest()
+    
+    def add(self, group: str, embeddings: np.ndarray, keys: List[str], text_keys: List[str]) -> None:
+        """
+        Merge new embeddings into a group.
+        
+        Args:
+            group: Persona group name
+            embeddings: New embeddings, shape (n, dim)
+            keys: ``item_key`` of each new critique
+            text_keys: ``text_key`` of each new critique
+        """
+        self._merge(group, embeddings, 1)
+        self.seen.update(zip(keys, text_keys))
+    
+    def remove(self, group: str, embeddings: np.ndarray) -> None:
+        """
+        Take embeddings of replaced critiques back out of a group.
+        
+        Args:
+            group: Persona group name
+            embeddings: Embeddings previously added, shape (n, dim)
+        """
+        self._merge(group, embeddings, -1)
+    
+    def _merge(self, group: str, embeddings: np.ndarray, sign: int) -> None:
+        """Add (sign 1) or subtract (sign -1) embeddings from a group's statistics."""
+        embeddings = np.asarray(embeddings, dtype=np.float64)
+        stats = self.groups.setdefault(
+            group, {'n': 0, 'sum': np.zeros(embeddings.shape[1]), 'sq_norm': 0.0}
+        )
+        stats['n'] += sign * len(embeddings)
+        stats['sum'] = stats['sum'] + sign * embeddings.sum(axis=0)
+        stats['sq_norm'] += sign * float(np.einsum('ij,ij->', embeddings, embeddings))
+    
+    def metrics(self, group: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Current metrics for one group, or for all critiques when group is None.
+        
+        Args:
+            group: Persona group name
+            
+        Returns:
+            Dictionary with num_critiques, diversity, coherence and centroid
+        """
+        groups = [self.groups[group]] if group is not None else [
+            g for g in self.groups.values() if g['n']
+        ]
+        n = sum(g['n'] for g in groups)
+        total = np.sum([g['sum'] for g in groups], axis=0)
+        sq_norm = sum(g['sq_norm'] for g in groups)
+        metrics = critique_set_metrics(n, total, sq_norm)
+        metrics['centroid'] = metrics['centroid'].astype(np.float32)
+        return {'num_critiques': n, **metrics}
+    
+    def save(self, path: str) -> None:
+        """Write the statistics to an ``.npz`` file."""
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        names = sorted(self.groups)
+        tmp_path = f"{path}.{os.getpid()}.tmp.npz"
+        np.savez(
+            tmp_path,
+            embedding_model=np.array(self.embedding_model),
+            groups=np.array(names, dtype=str),
+            counts=np.array([self.groups[g]['n'] for g in names], dtype=np.int64),
+            sums=np.array([self.groups[g]['sum'] for g in names], dtype=np.float64),
+            sq_norms=np.array([self.groups[g]['sq_norm'] for g in names], dtype=np.float64),
+            seen=np.array(list(self.seen), dtype=str),
+            seen_texts=np.array(list(self.seen.values()), dtype=str)
+        )
+        os.replace(tmp_path, path)
+    
+    @classmethod
+    def load(cls, path: str, embedding_model: str) -> "IncrementalAnalysis":
+        """
+        Load saved statistics, starting fresh if none exist or the model changed.
+        
+        Args:
+            path: Statistics file written by ``save``
+            embedding_model: Embedding model of the current run
+            
+        Returns:
+            IncrementalAnalysis
+        """
+        state = cls(embedding_model)
+        if not os.path.exists(path):
+            return state
+        with np.load(path) as data:
+            if str(data['embedding_model']) != embedding_model:
+                print(f"Warning: {path} was built with {data['embedding_model']}; recomputing")
+                return state
+            if 'seen_texts' not in data:
+                print(f"Warning: {path} predates per-job tracking; recomputing")
+                return state
+            for i, group in enumerate(data['groups']):
+                state.groups[str(group)] = {
+                    'n': int(data['counts'][i]),
+                    'sum': data['sums'][i],
+                    'sq_norm': float(data['sq_norms'][i])
+                }
+            state.seen = dict(zip(data['seen'].tolist(), data['seen_texts'].tolist()))
+        return state
 
 
 class SemanticAnalyzer:
     """Analyze MLLM critiques using semantic embeddings."""
     
-    def __init__(self, embedding_model: str = "BAAI/bge-large-zh-v1.5"):
+    def __init__(
+        self,
+        embedding_model: str = "BAAI/bge-large-zh-v1.5",
+        batch_size: int = 32,
+        store_path: Optional[str] = DEFAULT_EMBEDDING_STORE,
+        memory_items: int = 10000
+    ):
         """
         Initialize analyzer with embedding model.
         
         Args:
             embedding_model: Name of the sentence-transformers model
+            batch_size: Number of texts per encoder forward pass
+            store_path: Persistent embedding store shared by all analyzers
+                using the same path (None disables persistence)
+            memory_items: Maximum embeddings kept in the in-process LRU cache
+        """
+        self.embedding_model = embedding_model
+        self.batch_size = batch_size
+        self.store: Optional[EmbeddingStore] = open_embedding_store(store_path) if store_path else None
+        self.memory_items = memory_items
+        self.embeddings_cache = OrderedDict()
+    
+    @property
+    def model(self):
+        """Shared embedding model, loaded on first use."""
+        return get_embedding_model(self.embedding_model)
+    
+    def _remember(self, key: str, embedding: np.ndarray) -> None:
+        """Add an embedding to the in-memory LRU cache."""
+        self.embeddings_cache[key] = embedding
+        self.embeddings_cache.move_to_end(key)
+        while len(self.embeddings_cache) > self.memory_items:
+            self.embeddings_cache.popitem(last=False)
+    
+    def get_embeddings(self, texts: List[str]) -> np.ndarray:
+        """
+        Get unit-normalized semantic embeddings for several texts.
+        
+        Lookups go through the in-memory LRU, then the persistent store;
+        remaining texts are encoded together in batches of ``batch_size``
+        and written back to the store.
+        
+        Args:
+            texts: Input texts
+            
+        Returns:
+            Embedding matrix of shape (len(texts), dim)
         """
-        self.model = SentenceTransformer(embedding_model)
-        self.embeddings_cache = {}
+        keys = [hashlib.sha256(t.encode('utf-8')).hexdigest() for t in texts]
+        found = {}
+        for key in keys:
+            if key in self.embeddings_cache:
+                self.embeddings_cache.move_to_end(key)
+                found[key] = self.embeddings_cache[key]
+        
+        unique = dict(zip(keys, texts))
+        if self.store is not None:
+            lookup = [k for k in unique if k not in found]
+            if lookup:
+                found.update(self.store.get_many(self.embedding_model, lookup))
+        
+        missing = [k for k in unique if k not in found]
+        if missing:
+            encoded = self.model.encode(
+                [unique[k] for k in missing],
+                batch_size=self.batch_size,
+                normalize_embeddings=True,
+                convert_to_numpy=True
+            )
+            new_embeddings = dict(zip(missing, encoded))
+            if self.store is not None:
+                self.store.put_many(self.embedding_model, new_embeddings)
+                # Round through the storage dtype so results do not depend on cache state
+                new_embeddings = {
+                    k: v.astype(self.store.dtype).astype(np.float32)
+                    for k, v in new_embeddings.items()
+                }
+            found.update(new_embeddings)
+        
+        for key in unique:
+            self._remember(key, found[key])
+        if not texts:
+            return np.zeros((0, self.model.get_sentence_embedding_dimension()), dtype=np.float32)
+        return np.stack([found[k] for k in keys]).astype(np.float32, copy=False)
     
     def get_embedding(self, text: str) -> np.ndarray:
         """
@@ -35,11 +471,9 @@ class SemanticAnalyzer:
             text: Input text
             
         Returns:
-            Embedding vector
+            Unit-normalized embedding vector
         """
-        if text not in self.embeddings_cache:
-            self.embeddings_cache[text] = self.model.encode(text)
-        return self.embeddings_cache[text]
+        return self.get_embeddings([text])[0]
     
     def calculate_similarity(self, text1: str, text2: str) -> float:
         """
@@ -56,28 +490,34 @@ class SemanticAnalyzer:
         emb2 = self.get_embedding(text2)
         return 1 - cosine(emb1, emb2)
     
-    def calculate_emd(self, embeddings1: List[np.ndarray], embeddings2: List[np.ndarray]) -> float:
+    def calculate_emd(
+        self,
+        embeddings1: List[np.ndarray],
+        embeddings2: List[np.ndarray],
+        weights1: Optional[List[float]] = None,
+        weights2: Optional[List[float]] = None,
+        method: str = "auto"
+    ) -> float:
         """
         Calculate Earth Mover's Distance between two sets of embeddings.
         
         Args:
             embeddings1: First set of embeddings
             embeddings2: Second set of embeddings
+            weights1: Optional weights for the first set (uniform if None)
+            weights2: Optional weights for the second set (uniform if None)
+            method: 'exact', 'sinkhorn', or 'auto'
             
         Returns:
             EMD score
         """
-        if not embeddings1 or not embeddings2:
+        if len(embeddings1) == 0 or len(embeddings2) == 0:
             return float('inf')
         
-        # Calculate pairwise distances
-        distances = []
-        for emb1 in embeddings1:
-            for emb2 in embeddings2:
-                distances.append(cosine(emb1, emb2))
-        
-        # Use mean distance as simplified EMD
-        return np.mean(distances)
+        return earth_movers_distance(
+            np.asarray(embeddings1), np.asarray(embeddings2),
+            weights1, weights2, method
+        )
     
     def analyze_critique_set(self, critiques: List[str]) -> Dict[str, Any]:
         """
@@ -89,34 +529,96 @@ class SemanticAnalyzer:
         Returns:
             Analysis results dictionary
         """
-        embeddings = [self.get_embedding(c) for c in critiques]
-        
-        # Calculate centroid
-        centroid = np.mean(embeddings, axis=0)
-        
-        # Calculate diversity (mean pairwise distance)
-        diversity_scores = []
-        for i in range(len(embeddings)):
-            for j in range(i+1, len(embeddings)):
-                diversity_scores.append(cosine(embeddings[i], embeddings[j]))
-        diversity = np.mean(diversity_scores) if diversity_scores else 0
-        
-        # Calculate coherence (distance from centroid)
-        coherence_scores = [cosine(emb, centroid) for emb in embeddings]
-        coherence = 1 - np.mean(coherence_scores)
+        embeddings = self.get_embeddings(critiques)
+        total = embeddings.sum(axis=0)
+        metrics = critique_set_metrics(
+            len(embeddings), total, float(np.einsum('ij,ij->', embeddings, embeddings))
+        )
         
         return {
             'num_critiques': len(critiques),
-            'diversity': diversity,
-            'coherence': coherence,
-            'centroid': centroid.tolist(),
-            'embeddings': [emb.tolist() for emb in embeddings]
+            **metrics,
+            'embeddings': embeddings
         }
 
 
+class EmbeddingPipeline:
+    """
+    Background consumer that embeds critiques while generation is still running.
+    
+    Producers ``submit`` critiques into a bounded queue (blocking when the
+    embedder falls behind); a worker thread drains it in micro-batches
+    through the analyzer, so its memory cache and embedding store are warm
+    by the time the final analysis runs.
+    """
+    
+    _STOP = object()
+    
+    def __init__(self, analyzer: "SemanticAnalyzer", max_queue: int = 256):
+        """
+        Start the embedding worker.
+        
+        Args:
+            analyzer: Analyzer whose caches receive the embeddings
+            max_queue: Maximum critiques waiting to be embedded
+        """
+        self.analyzer = analyzer
+        self.embedded = 0
+        self.errors = 0
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._thread = threading.Thread(target=self._run, name="embedding-pipeline", daemon=True)
+        self._thread.start()
+    
+    def submit(self, critique: str) -> None:
+        """Queue a critique for embedding (blocks while the queue is full)."""
+        if critique:
+            self._queue.put(critique)
+    
+    def _run(self) -> None:
+        """Worker loop: embed whatever is queued, up to one encoder batch at a time."""
+        # Load the model before the first critique arrives
+        try:
+            self.analyzer.model
+        except Exception as e:
+            print(f"✗ Embedding model failed to load: {e}")
+        stopping = False
+        while not stopping:
+            batch = [self._queue.get()]
+            while len(batch) < self.analyzer.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            if batch[-1] is self._STOP:
+                batch.pop()
+                stopping = True
+            if not batch:
+                continue
+            try:
+                self.analyzer.get_embeddings(batch)
+                self.embedded += len(batch)
+            except Exception as e:
+                # Final analysis re-embeds anything missing
+                self.errors += len(batch)
+                print(f"✗ Embedding pipeline error: {e}")
+    
+    def close(self) -> None:
+        """Embed everything still queued and stop the worker."""
+        self._queue.put(self._STOP)
+        self._thread.join()
+    
+    def __enter__(self) -> "EmbeddingPipeline":
+        return self
+    
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
 def analyze_critiques(
     critiques: List[str],
-    embedding_model: str = "BAAI/bge-large-zh-v1.5"
+    embedding_model: str = "BAAI/bge-large-zh-v1.5",
+    batch_size: int = 32,
+    store_path: Optional[str] = DEFAULT_EMBEDDING_STORE
 ) -> Dict[str, Any]:
     """
     Analyze a list of critiques.
@@ -124,19 +626,96 @@ def analyze_critiques(
     Args:
         critiques: List of critique texts
         embedding_model: Model for embeddings
+        batch_size: Number of texts per encoder forward pass
+        store_path: Persistent embedding store (None disables persistence)
         
     Returns:
         Analysis results
     """
-    analyzer = SemanticAnalyzer(embedding_model)
+    analyzer = SemanticAnalyzer(embedding_model, batch_size, store_path)
     return analyzer.analyze_critique_set(critiques)
 
 
+def save_analysis(analysis: Dict[str, Any], json_path: str) -> Dict[str, Any]:
+    """
+    Save analysis results as a slim JSON summary with arrays in sidecar ``.npy`` files.
+    
+    Every NumPy array in the (possibly nested) results is written to
+    ``<json stem>_arrays/<key path>.npy`` and replaced in the JSON by a
+    reference holding its relative path, shape and dtype.
+    
+    Args:
+        analysis: Analysis results (may contain np.ndarray values)
+        json_path: Output JSON path
+        
+    Returns:
+        The JSON-serializable summary that was written
+    """
+    base_dir = os.path.dirname(json_path) or '.'
+    arrays_dir = os.path.splitext(json_path)[0] + '_arrays'
+    
+    def externalize(value, key_path):
+        if isinstance(value, np.ndarray):
+            os.makedirs(arrays_dir, exist_ok=True)
+            name = re.sub(r'[^\w.-]', '_', '.'.join(key_path)) or 'array'
+            array_path = os.path.join(arrays_dir, f"{name}.npy")
+            np.save(array_path, value)
+            return {
+                '__ndarray__': os.path.relpath(array_path, base_dir),
+                'shape': list(value.shape),
+                'dtype': value.dtype.name
+            }
+        if isinstance(value, dict):
+            return {k: externalize(v, key_path + [str(k)]) for k, v in value.items()}
+        if isinstance(value, (list, tuple)):
+            return [externalize(v, key_path + [str(i)]) for i, v in enumerate(value)]
+        if isinstance(value, np.generic):
+            return value.item()
+        return value
+    
+    summary = externalize(analysis, [])
+    os.makedirs(base_dir, exist_ok=True)
+    with open(json_path, 'w', encoding='utf-8') as f:
+        json.dump(summary, f, ensure_ascii=False, indent=2)
+    return summary
+
+
+def load_analysis(json_path: str, mmap: bool = True) -> Dict[str, Any]:
+    """
+    Load analysis results written by ``save_analysis``.
+    
+    Args:
+        json_path: Summary JSON path
+        mmap: Memory-map sidecar arrays instead of reading them into memory
+        
+    Returns:
+        Analysis results with array references resolved to np.ndarray
+    """
+    base_dir = os.path.dirname(json_path) or '.'
+    
+    def resolve(value):
+        if isinstance(value, dict):
+            if '__ndarray__' in value:
+                return np.load(
+                    os.path.join(base_dir, value['__ndarray__']),
+                    mmap_mode='r' if mmap else None
+                )
+            return {k: resolve(v) for k, v in value.items()}
+        if isinstance(value, list):
+            return [resolve(v) for v in value]
+        return value
+    
+    with open(json_path, 'r', encoding='utf-8') as f:
+        return resolve(json.load(f))
+
+
 def compare_with_benchmark(
     critique: str,
     benchmark_file: str = "data/human_expert_benchmark.json",
-    embedding_model: str = "BAAI/bge-large-zh-v1.5"
-) -> Dict[str, float]:
+    embedding_model: str = "BAAI/bge-large-zh-v1.5",
+    analyzer: Optional[SemanticAnalyzer] = None,
+    top_k: int = 5
+) -> Dict[str, Any]:
     """
     Compare a critique with human expert benchmark.
     
@@ -144,89 +723,157 @@ def compare_with_benchmark(
         critique: Generated critique text
         benchmark_file: Path to benchmark file
         embedding_model: Model for embeddings
+        analyzer: Existing analyzer to reuse (overrides embedding_model)
+        top_k: Number of nearest expert critiques to report
         
     Returns:
         Comparison metrics
     """
-    analyzer = SemanticAnalyzer(embedding_model)
-    
-    # Load benchmark
-    if os.path.exists(benchmark_file):
-        with open(benchmark_file, 'r', encoding='utf-8') as f:
-            benchmark = json.load(f)
-    else:
-        print(f"Warning: Benchmark file not found: {benchmark_file}")
-        return {}
-    
-    # Get embeddings
-    critique_emb = analyzer.get_embedding(critique)
-    benchmark_embs = [analyzer.get_embedding(b) for b in benchmark.get('critiques', [])]
-    
-    if not benchmark_embs:
-        return {'error': 'No benchmark data available'}
+    results = compare_batch_with_benchmark(
+        [critique], benchmark_file, embedding_model, analyzer, top_k
+    )
+    return results[0] if results else {}
+
+
+def compare_batch_with_benchmark(
+    critiques: List[str],
+    benchmark_file: str = "data/human_expert_benchmark.json",
+    embedding_model: str = "BAAI/bge-large-zh-v1.5",
+    analyzer: Optional[SemanticAnalyzer] = None,
+    top_k: int = 5,
+    n_lists: Optional[int] = None,
+    index_dir: str = DEFAULT_INDEX_DIR,
+    exact_stats: Optional[bool] = None
+) -> List[Dict[str, Any]]:
+    """
+    Compare many critiques with the human expert benchmark at once.
     
-    # Calculate metrics
-    similarities = [1 - cosine(critique_emb, b_emb) for b_emb in benchmark_embs]
+    The benchmark is embedded once into a persisted vector index; every
+    critique is then scored with a few matrix products. The exact
+    max/mean/min/std statistics need a full scan of the benchmark, which
+    also yields exact neighbors, so the IVF index (``n_lists``) only saves
+    work when those statistics are skipped; by default they are.
     
-    return {
-        'max_similarity': max(similarities),
-        'mean_similarity': np.mean(similarities),
-        'min_similarity': min(similarities),
-        'std_similarity': np.std(similarities)
-    }
+    Args:
+        critiques: Generated critique texts
+        benchmark_file: Path to benchmark file
+        embedding_model: Model for embeddings
+        analyzer: Existing analyzer to reuse (overrides embedding_model)
+        top_k: Number of nearest expert critiques to report per critique
+        n_lists: IVF lists for the benchmark index (None for exact flat search)
+        index_dir: Directory for persisted benchmark indexes
+        exact_stats: Report mean/min/std similarity over the whole benchmark
+            (defaults to True for a flat index, False with ``n_lists``)
+        
+    Returns:
+        Comparison metrics per critique (empty list if the benchmark is missing);
+        without exact statistics, max_similarity is that of the nearest neighbor found
+    """
+    analyzer = analyzer or SemanticAnalyzer(embedding_model)
+    
+    index, _ = load_benchmark_index(benchmark_file, analyzer, index_dir, n_lists)
+    if index is None:
+        return []
+    if not len(index):
+        return [{'error': 'No benchmark data available'} for _ in critiques]
+    
+    embeddings = analyzer.get_embeddings(critiques)
+    if exact_stats is None:
+        exact_stats = not index.is_ivf
+    if exact_stats:
+        stats, scores, neighbors = index.scan(embeddings, top_k)
+    else:
+        scores, neighbors = index.search(embeddings, max(1, top_k))
+    
+    comparisons = []
+    for row, (score_row, neighbor_row) in enumerate(zip(scores, neighbors)):
+        nearest = [
+            {'index': int(i), 'similarity': float(score)}
+            for i, score in zip(neighbor_row, score_row) if i >= 0
+        ]
+        if exact_stats:
+            comparison = {
+                'max_similarity': float(stats[row, 0]),
+                'mean_similarity': float(stats[row, 1]),
+                'min_similarity': float(stats[row, 2]),
+                'std_similarity': float(stats[row, 3])
+            }
+        else:
+            comparison = {'max_similarity': nearest[0]['similarity'] if nearest else None}
+        comparison['nearest_benchmark'] = nearest[:top_k]
+        comparisons.append(comparison)
+    return comparisons
 
 
 def run_full_analysis(
     results: List[Dict[str, Any]],
-    output_dir: str = "outputs/analysis"
+    output_dir: str = "outputs/analysis",
+    analyzer: Optional[SemanticAnalyzer] = None,
+    incremental: bool = False
 ) -> Dict[str, Any]:
     """
     Run complete analysis on evaluation results.
     
+    In incremental mode, per-persona statistics are kept in
+    ``analysis_state.npz`` under output_dir; only jobs that are new or whose
+    critique changed since an earlier run are embedded and merged, and the
+    summary omits the per-critique embeddings.
+    
     Args:
         results: List of evaluation results
         output_dir: Directory to save analysis
+        analyzer: Existing analyzer to reuse
+        incremental: Merge new critiques into saved statistics
         
     Returns:
         Analysis summary
     """
     os.makedirs(output_dir, exist_ok=True)
-    
-    # Extract critiques
-    critiques = [r.get('critique', '') for r in results if r.get('critique')]
-    
-    if not critiques:
-        return {'error': 'No critiques to analyze'}
-    
-    # Analyze critique set
-    analyzer = SemanticAnalyzer()
-    analysis = analyzer.analyze_critique_set(critiques)
-    
-    # Add metadata
-    analysis['num_results'] = len(results)
-    analysis['num_valid_critiques'] = len(critiques)
+    analyzer = analyzer or SemanticAnalyzer()
     
     # Group by persona if available
     persona_groups = {}
     for r in results:
-        persona = r.get('persona', 'baseline')
+        persona = r.get('persona') or 'baseline'
         if persona not in persona_groups:
             persona_groups[persona] = []
         if r.get('critique'):
             persona_groups[persona].append(r['critique'])
     
-    # Analyze each persona group
-    persona_analyses = {}
-    for persona, p_critiques in persona_groups.items():
-        if p_critiques:
-            persona_analyses[persona] = analyzer.analyze_critique_set(p_critiques)
+    if incremental:
+        analysis = _update_incremental_analysis(
+            results, analyzer, os.path.join(output_dir, "analysis_state.npz")
+        )
+        analysis['num_results'] = len(results)
+    else:
+        # Extract critiques
+        critiques = [r.get('critique', '') for r in results if r.get('critique')]
+        
+        if not critiques:
+            return {'error': 'No critiques to analyze'}
+        
+        # Analyze critique set
+        analysis = analyzer.analyze_critique_set(critiques)
+        
+        # Add metadata
+        analysis['num_results'] = len(results)
+        analysis['num_valid_critiques'] = len(critiques)
+        
+        # Analyze each persona group
+        persona_analyses = {}
+        for persona, p_critiques in persona_groups.items():
+            if p_critiques:
+                persona_analyses[persona] = analyzer.analyze_critique_set(p_critiques)
+        
+        analysis['persona_analyses'] = persona_analyses
     
-    analysis['persona_analyses'] = persona_analyses
+    if not analysis['num_valid_critiques']:
+        return {'error': 'No critiques to analyze'}
+    persona_analyses = analysis['persona_analyses']
     
     # Save analysis
     analysis_file = os.path.join(output_dir, "analysis_summary.json")
-    with open(analysis_file, 'w', encoding='utf-8') as f:
-        json.dump(analysis, f, ensure_ascii=False, indent=2)
+    save_analysis(analysis, analysis_file)
     
     print(f"✓ Analysis saved to: {analysis_file}")
     
@@ -244,6 +891,67 @@ def run_full_analysis(
     return analysis
 
 
+def _update_incremental_analysis(
+    results: List[Dict[str, Any]],
+    analyzer: SemanticAnalyzer,
+    state_path: str
+) -> Dict[str, Any]:
+    """Embed new or changed critiques, merge them into saved statistics and report metrics."""
+    state = IncrementalAnalysis.load(state_path, analyzer.embedding_model)
+    
+    # Latest critique of each job; unchanged jobs are skipped
+    items = {}
+    for r in results:
+        if r.get('critique'):
+            persona = r.get('persona') or 'baseline'
+            key = IncrementalAnalysis.item_key(persona, r)
+            items[key] = (persona, IncrementalAnalysis.text_key(r['critique']), r['critique'])
+    new_items = [
+        (persona, key, text_key, critique)
+        for key, (persona, text_key, critique) in items.items()
+        if state.seen.get(key) != text_key
+    ]
+    replaced = [(persona, key) for persona, key, _, _ in new_items if key in state.seen]
+    
+    if replaced:
+        # Old vectors come back from the embedding store by their text hash
+        old_keys = [state.seen[key] for _, key in replaced]
+        old = analyzer.store.get_many(analyzer.embedding_model, old_keys) if analyzer.store is not None else {}
+        old.update({k: analyzer.embeddings_cache[k] for k in old_keys if k in analyzer.embeddings_cache})
+        if all(k in old for k in old_keys):
+            for persona, key in replaced:
+                state.remove(persona, old[state.seen[key]][None, :])
+        else:
+            print("Warning: replaced critiques are no longer in the embedding store; recomputing")
+            state = IncrementalAnalysis(analyzer.embedding_model)
+            new_items = [
+                (persona, key, text_key, critique)
+                for key, (persona, text_key, critique) in items.items()
+            ]
+    
+    if new_items:
+        embeddings = analyzer.get_embeddings([critique for _, _, _, critique in new_items])
+        for persona in dict.fromkeys(p for p, _, _, _ in new_items):
+            rows = [i for i, item in enumerate(new_items) if item[0] == persona]
+            state.add(
+                persona, embeddings[rows],
+                [new_items[i][1] for i in rows], [new_items[i][2] for i in rows]
+            )
+        state.save(state_path)
+    print(f"✓ Merged {len(new_items)} new critiques into incremental analysis")
+    
+    if not any(g['n'] for g in state.groups.values()):
+        return {'num_valid_critiques': 0, 'persona_analyses': {}}
+    
+    analysis = state.metrics()
+    analysis['num_valid_critiques'] = analysis['num_critiques']
+    analysis['num_new_critiques'] = len(new_items)
+    analysis['persona_analyses'] = {
+        group: state.metrics(group) for group in sorted(state.groups) if state.groups[group]['n']
+    }
+    return analysis
+
+
 def main():
     """Command-line interface."""
     import argparse
@@ -253,6 +961,9 @@ def main():
     parser.add_argument("--benchmark", help="Benchmark file for comparison")
     parser.add_argument("--output", default="outputs/analysis", help="Output directory")
     parser.add_argument("--model", default="BAAI/bge-large-zh-v1.5", help="Embedding model")
+    parser.add_argument("--batch-size", type=int, default=32, help="Texts per embedding batch")
+    parser.add_argument("--embedding-store", default=DEFAULT_EMBEDDING_STORE,
+                        help="Persistent embedding store path ('' to disable)")
     
     args = parser.parse_args()
     
@@ -279,22 +990,23 @@ def main():
         print("No critiques found to analyze")
         return
     
-    # Analyze
-    analysis = analyze_critiques(critiques, args.model)
+    # Analyze (one analyzer shares the loaded model and embedding caches)
+    analyzer = SemanticAnalyzer(args.model, args.batch_size, args.embedding_store or None)
+    analysis = analyzer.analyze_critique_set(critiques)
     
     # Compare with benchmark if provided
     if args.benchmark:
-        for i, critique in enumerate(critiques[:5]):  # Analyze first 5
-            comparison = compare_with_benchmark(critique, args.benchmark, args.model)
+        comparisons = compare_batch_with_benchmark(critiques[:5], args.benchmark, analyzer=analyzer)
+        for i, comparison in enumerate(comparisons):  # Analyze first 5
             print(f"\nCritique {i+1} benchmark comparison:")
-            print(f"  Mean similarity: {comparison.get('mean_similarity', 0):.3f}")
+            if 'mean_similarity' in comparison:
+                print(f"  Mean similarity: {comparison['mean_similarity']:.3f}")
             print(f"  Max similarity: {comparison.get('max_similarity', 0):.3f}")
     
     # Save results
     os.makedirs(args.output, exist_ok=True)
     output_file = os.path.join(args.output, "analysis_results.json")
-    with open(output_file, 'w', encoding='utf-8') as f:
-        json.dump(analysis, f, ensure_ascii=False, indent=2)
+    save_analysis(analysis, output_file)
     
     print(f"\n✓ Analysis complete. Results saved to: {output_file}")
 
@@ -0,0 +1,277 @@
+#!/usr/bin/env python
+"""
+VULCA Framework - Caching Module
+Content-addressed on-disk caches for generated critiques and embeddings
+"""
+
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+import numpy as np
+from typing import Dict, Any, List, Optional, Tuple
+
+
+_file_hashes: Dict[Tuple[str, float, int], str] = {}
+_file_hashes_lock = threading.Lock()
+
+
+def hash_file(file_path: str) -> str:
+    """
+    Compute the SHA-256 digest of a file's contents.
+    
+    Digests are memoized per (path, mtime, size) so repeated lookups for the
+    same painting do not reread it.
+    
+    Args:
+        file_path: Path to the file
+    
+    Returns:
+        Hex digest
+    """
+    stat = os.stat(file_path)
+    memo_key = (os.path.abspath(file_path), stat.st_mtime, stat.st_size)
+    with _file_hashes_lock:
+        if memo_key in _file_hashes:
+            return _file_hashes[memo_key]
+    
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    
+    with _file_hashes_lock:
+        _file_hashes[memo_key] = digest.hexdigest()
+    return _file_hashes[memo_key]
+
+
+class CritiqueCache:
+    """SQLite-backed critique cache with size- and age-based eviction."""
+    
+    def __init__(
+        self,
+        path: str = "outputs/cache/critiques.sqlite",
+        max_size_mb: Optional[float] = None,
+        max_age_days: Optional[float] = None
+    ):
+        """
+        Open (or create) a critique cache.
+        
+        Args:
+            path: SQLite database path
+            max_size_mb: Evict least recently used entries beyond this size
+            max_age_days: Treat entries older than this as expired
+        """
+        self.path = path
+        self.max_bytes = int(max_size_mb * 1024 * 1024) if max_size_mb else None
+        self.max_age = max_age_days * 86400 if max_age_days else None
+        self.hits = 0
+        self.misses = 0
+        
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS critiques ("
+            "key TEXT PRIMARY KEY, critique TEXT NOT NULL, size INTEGER NOT NULL, "
+            "created REAL NOT NULL, accessed REAL NOT NULL)"
+        )
+        self._conn.commit()
+        self.evict()
+    
+    @staticmethod
+    def make_key(
+        image_path: str,
+        prompt_text: str,
+        model_name: str,
+        model_params: Optional[Dict[str, Any]] = None
+    ) -> str:
+        """
+        Build the cache key for a critique request.
+        
+        The prompt already contains the persona text and knowledge context, so
+        hashing it together with the image contents and model settings covers
+        every input that affects generation.
+        
+        Args:
+            image_path: Path to input image
+            prompt_text: Full prompt sent to the model
+            model_name: Model identifier
+            model_params: Model generation parameters
+        
+        Returns:
+            Hex cache key
+        """
+        key_data = json.dumps({
+            'image': hash_file(image_path),
+            'prompt': prompt_text,
+            'model': model_name,
+            'params': model_params or {}
+        }, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(key_data.encode('utf-8')).hexdigest()
+    
+    def get(self, key: str) -> Optional[str]:
+        """Return the cached critique for a key, or None if missing/expired."""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT critique, created FROM critiques WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or (self.max_age and now - row[1] > self.max_age):
+                self.misses += 1
+                return None
+            self._conn.execute(
+                "UPDATE critiques SET accessed = ? WHERE key = ?", (now, key)
+            )
+            self._conn.commit()
+            self.hits += 1
+            return row[0]
+    
+    def put(self, key: str, critique: str) -> None:
+        """Store a critique and enforce the size limit."""
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO critiques VALUES (?, ?, ?, ?, ?)",
+                (key, critique, len(critique.encode('utf-8')), now, now)
+            )
+            self._conn.commit()
+        if self.max_bytes:
+            self.evict()
+    
+    def evict(self) -> int:
+        """
+        Remove expired entries and least recently used entries over the size limit.
+        
+        Returns:
+            Number of entries removed
+        """
+        removed = 0
+        with self._lock:
+            if self.max_age:
+                cursor = self._conn.execute(
+                    "DELETE FROM critiques WHERE created < ?",
+                    (time.time() - self.max_age,)
+                )
+                removed += cursor.rowcount
+            if self.max_bytes:
+                total = self._conn.execute(
+                    "SELECT COALESCE(SUM(size), 0) FROM critiques"
+                ).fetchone()[0]
+                if total > self.max_bytes:
+                    rows = self._conn.execute(
+                        "SELECT key, size FROM critiques ORDER BY accessed"
+                    ).fetchall()
+                    stale = []
+                    for key, size in rows:
+                        if total <= self.max_bytes:
+                            break
+                        stale.append((key,))
+                        total -= size
+                    self._conn.executemany("DELETE FROM critiques WHERE key = ?", stale)
+                    removed += len(stale)
+            self._conn.commit()
+        return removed
+    
+    def close(self) -> None:
+        """Close the underlying database."""
+        with self._lock:
+            self._conn.close()
+
+
+class EmbeddingStore:
+    """
+    SQLite blob store of text embeddings keyed by (model name, text hash).
+    
+    Vectors are stored as float16 by default, which halves disk use and is
+    ample precision for cosine-based metrics.
+    """
+    
+    def __init__(self, path: str = "outputs/cache/embeddings.sqlite", dtype: str = "float16"):
+        """
+        Open (or create) an embedding store.
+        
+        Args:
+            path: SQLite database path
+            dtype: Storage dtype for vectors ('float16' or 'float32')
+        """
+        self.path = path
+        self.dtype = np.dtype(dtype)
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "model TEXT NOT NULL, key TEXT NOT NULL, dtype TEXT NOT NULL, "
+            "vector BLOB NOT NULL, PRIMARY KEY (model, key))"
+        )
+        self._conn.commit()
+    
+    @staticmethod
+    def text_key(text: str) -> str:
+        """Hash a text to its store key."""
+        return hashlib.sha256(text.encode('utf-8')).hexdigest()
+    
+    def get_many(self, model_name: str, keys: List[str]) -> Dict[str, np.ndarray]:
+        """
+        Fetch stored embeddings.
+        
+        Args:
+            model_name: Embedding model name
+            keys: Text keys (see ``text_key``)
+            
+        Returns:
+            Mapping from key to float32 vector for keys that are stored
+        """
+        found = {}
+        with self._lock:
+            # Stay well below SQLite's bound-parameter limit
+            for start in range(0, len(keys), 500):
+                chunk = keys[start:start + 500]
+                rows = self._conn.execute(
+                    f"SELECT key, dtype, vector FROM embeddings WHERE model = ? "
+                    f"AND key IN ({','.join('?' * len(chunk))})",
+                    [model_name] + chunk
+                ).fetchall()
+                for key, dtype, blob in rows:
+                    found[key] = np.frombuffer(blob, dtype=dtype).astype(np.float32)
+        return found
+    
+    def put_many(self, model_name: str, vectors: Dict[str, np.ndarray]) -> None:
+        """
+        Store embeddings.
+        
+        Args:
+            model_name: Embedding model name
+            vectors: Mapping from text key to vector
+        """
+        rows = [
+            (model_name, key, self.dtype.name, vector.astype(self.dtype).tobytes())
+            for key, vector in vectors.items()
+        ]
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?, ?)", rows
+            )
+            self._conn.commit()
+    
+    def close(self) -> None:
+        """Close the underlying database."""
+        with self._lock:
+            self._conn.close()
+
+
+_embedding_stores: Dict[str, EmbeddingStore] = {}
+_embedding_stores_lock = threading.Lock()
+
+
+def open_embedding_store(path: str, dtype: str = "float16") -> EmbeddingStore:
+    """Return the process-wide embedding store for a path, opening it on first use."""
+    with _embedding_stores_lock:
+        if path not in _embedding_stores:
+            _embedding_stores[path] = EmbeddingStore(path, dtype)
+        return _embedding_stores[path]
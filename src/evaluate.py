@@ -5,36 +5,148 @@ Simplified version for EMNLP 2025
 """
 
 import os
+import io
 import json
 import base64
+import threading
+from collections import OrderedDict
 from datetime import datetime
-from typing import Dict, Optional, Any
-import requests
+from typing import Dict, List, Optional, Any, Union
 
+try:
+    from .model import RetryPolicy, get_client
+    from .retrieval import KnowledgeRetriever
+    from .cache import CritiqueCache
+    from .generation import GenerationParams
+    from .tiling import open_pil_image
+except ImportError:  # Executed as a script from src/
+    from model import RetryPolicy, get_client
+    from retrieval import KnowledgeRetriever
+    from cache import CritiqueCache
+    from generation import GenerationParams
+    from tiling import open_pil_image
 
 
+class PayloadCache:
+    """Bounded LRU cache of base64-encoded image payloads."""
+    
+    def __init__(self, max_mb: float = 256):
+        """
+        Initialize payload cache.
+        
+        Args:
+            max_mb: Maximum total size of cached payloads in megabytes
+        """
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, key: tuple) -> Optional[tuple]:
+        """Return a cached (base64_string, mime_type) pair, marking it recently used."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+    
+    def put(self, key: tuple, entry: tuple) -> None:
+        """Store a payload, evicting least recently used entries over the budget."""
+        entry_size = len(entry[0])
+        if entry_size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self.size -= len(self._entries.pop(key)[0])
+            self._entries[key] = entry
+            self.size += entry_size
+            while self.size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.size -= len(evicted[0])
+    
+    def clear(self) -> None:
+        """Drop all cached payloads."""
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
 
-def encode_image_to_base64(image_path: str) -> tuple[str, str]:
+payload_cache = PayloadCache()
+
+
+def _downscale_image(image_path: str, max_pixels: int) -> Optional[tuple]:
+    """
+    Re-encode an image so it has at most ``max_pixels`` pixels.
+    
+    Paintings far above PIL's decompression-bomb limit are accepted. JPEGs
+    are decoded directly at a reduced scale, and other formats are shrunk by
+    an integer factor before the final LANCZOS resample.
+    
+    Returns:
+        tuple: (image_bytes, mime_type), or None if no downscaling is needed
+    """
+    from PIL import Image
+    
+    with open_pil_image(image_path) as img:
+        width, height = img.size
+        if width * height <= max_pixels:
+            return None
+        scale = (max_pixels / float(width * height)) ** 0.5
+        new_size = (max(1, int(width * scale)), max(1, int(height * scale)))
+        img.thumbnail(new_size, Image.LANCZOS, reducing_gap=3.0)
+        
+        buffer = io.BytesIO()
+        if img.mode in ("RGBA", "LA", "P"):
+            img.save(buffer, format="PNG", optimize=True)
+            return buffer.getvalue(), "image/png"
+        img.convert("RGB").save(buffer, format="JPEG", quality=90)
+        return buffer.getvalue(), "image/jpeg"
+
+
+def encode_image_to_base64(image_path: str, max_pixels: Optional[int] = None) -> tuple[str, str]:
     """
     Encode image file to base64 string.
     
+    Encoded payloads are memoized in ``payload_cache`` keyed on the file's
+    path, modification time, size and ``max_pixels``, so evaluating the same
+    painting with several personas reads and encodes it only once.
+    
     Args:
         image_path: Path to the image file
-        
+        max_pixels: Downscale images above this pixel count (e.g. the model's
+            maximum vision resolution) before encoding
+    
     Returns:
         tuple: (base64_string, mime_type)
     """
     try:
-        with open(image_path, "rb") as image_file:
-            encoded_string = base64.b64encode(image_file.read()).decode("utf-8")
-            
+        stat = os.stat(image_path)
+        key = (os.path.abspath(image_path), stat.st_mtime, stat.st_size, max_pixels)
+        cached = payload_cache.get(key)
+        if cached is not None:
+            return cached
+        
         # Determine MIME type
         mime_type = "image/jpeg"  # Default
         if image_path.lower().endswith(".png"):
             mime_type = "image/png"
         elif image_path.lower().endswith(".webp"):
             mime_type = "image/webp"
-            
+        
+        downscaled = _downscale_image(image_path, max_pixels) if max_pixels else None
+        if downscaled is not None:
+            image_bytes, mime_type = downscaled
+        else:
+            with open(image_path, "rb") as image_file:
+                image_bytes = image_file.read()
+        encoded_string = base64.b64encode(image_bytes).decode("utf-8")
+        
+        payload_cache.put(key, (encoded_string, mime_type))
         return encoded_string, mime_type
     except FileNotFoundError:
         raise FileNotFoundError(f"Image file not found: {image_path}")
@@ -42,12 +154,29 @@ def encode_image_to_base64(image_path: str) -> tuple[str, str]:
         raise Exception(f"Failed to encode image: {e}")
 
 
+def generation_params(model_params: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    Validate model generation parameters and map them to chat completion request fields.
+    
+    Accepts ``max_tokens`` or its alias ``max_new_tokens``, ``temperature``
+    and ``top_p`` (see ``GenerationParams``); unknown keys raise ValueError.
+    """
+    return GenerationParams.from_config(model_params, strict=True).to_request()
+
+
 def call_mllm_api(
     image_path: str,
     prompt_text: str,
     model_name: str,
-    api_endpoint: str = "http://localhost:8000/v1/chat/completions",
-    model_params: Optional[Dict[str, Any]] = None
+    api_endpoint: Union[str, List[str]] = "http://localhost:8000/v1/chat/completions",
+    model_params: Optional[Dict[str, Any]] = None,
+    max_image_pixels: Optional[int] = None,
+    retry_policy: Optional[RetryPolicy] = None,
+    image_first: bool = False,
+    metrics: Optional[Dict[str, Any]] = None,
+    stream: bool = False,
+    idle_timeout: float = 30.0,
+    stream_path: Optional[str] = None
 ) -> str:
     """
     Call MLLM API with image and prompt.
@@ -56,67 +185,76 @@ def call_mllm_api(
         image_path: Path to input image
         prompt_text: Text prompt for the model
         model_name: Model identifier
-        api_endpoint: API endpoint URL
+        api_endpoint: API endpoint URL (a list load-balances across replicas)
         model_params: Additional model parameters
-        
+        max_image_pixels: Downscale the image to the model's vision resolution
+        retry_policy: Retry/hedging policy for transient API failures (None sends once)
+        image_first: Send the image before the prompt text (prefix-cache friendly)
+        metrics: Dictionary updated with the response's token usage (and, when
+            streaming, its latency breakdown under 'timing')
+        stream: Stream the response (SSE) instead of waiting for the full completion
+        idle_timeout: When streaming, seconds without new data before the request fails
+        stream_path: When streaming, file the critique is written to as it arrives
+    
     Returns:
         Generated critique text
     """
     # Encode image
-    encoded_image, mime_type = encode_image_to_base64(image_path)
-    
-    # Construct payload
-    payload = {
-        "model": model_name,
-        "messages": [{
-            "role": "user",
-            "content": [
-                {"type": "text", "text": prompt_text},
-                {
-                    "type": "image_url",
-                    "image_url": {
-                        "url": f"data:{mime_type};base64,{encoded_image}"
-                    }
-                }
-            ]
-        }]
-    }
+    encoded_image, mime_type = encode_image_to_base64(image_path, max_image_pixels)
     
     # Add model parameters
-    if model_params:
-        if 'max_new_tokens' in model_params:
-            payload['max_tokens'] = model_params['max_new_tokens']
-        if 'temperature' in model_params:
-            payload['temperature'] = model_params['temperature']
+    params = generation_params(model_params)
     
-    # Make API call
-    try:
-        response = requests.post(
-            api_endpoint,
-            headers={"Content-Type": "application/json"},
-            json=payload,
-            timeout=180
-        )
-        response.raise_for_status()
-        
-        result = response.json()
-        
-        # Extract generated text
-        if 'choices' in result and result['choices']:
-            return result['choices'][0]['message']['content'].strip()
-        else:
-            raise ValueError(f"Unexpected API response format: {result}")
-            
-    except requests.exceptions.Timeout:
-        raise TimeoutError(f"API request timed out after 180 seconds")
-    except requests.exceptions.ConnectionError as e:
-        raise ConnectionError(f"Failed to connect to API server: {e}")
-    except requests.exceptions.HTTPError as e:
-        raise RuntimeError(f"HTTP error during API call: {e}")
-
-
-def construct_prompt(persona_text: str = "", knowledge_context: str = "") -> str:
-    """Construct evaluation prompt with optional persona and knowledge enhancement."""
+    # Make API call over the shared pooled session
+    client = get_client(model_name, api_endpoint)
+    payload = client.build_payload(
+        prompt_text,
+        f"data:{mime_type};base64,{encoded_image}",
+        image_first=image_first,
+        **params
+    )
+    if stream:
+        def send():
+            if not stream_path:
+                return client.chat_stream(payload, idle_timeout=idle_timeout)
+            # Each attempt starts the file over
+            with open(stream_path, 'w', encoding='utf-8') as f:
+                def write(delta):
+                    f.write(delta)
+                    f.flush()
+                return client.chat_stream(payload, write, idle_timeout)
+    else:
+        def send():
+            return client.chat(payload)
+    
+    if retry_policy is None:
+        result = send()
+    else:
+        result = retry_policy.call(send, hedge=not stream_path)
+    if metrics is not None:
+        metrics.update(client.extract_usage(result))
+        if 'timing' in result:
+            metrics['timing'] = result['timing']
+    return client.extract_text(result)
+
+
+PROMPT_LAYOUTS = ('persona_first', 'prefix_cache')
+
+
+def construct_prompt(
+    persona_text: str = "",
+    knowledge_context: str = "",
+    layout: str = "persona_first"
+) -> str:
+    """
+    Construct evaluation prompt with optional persona and knowledge enhancement.
+    
+    The 'prefix_cache' layout starts with the shared critique instructions and
+    appends knowledge and persona text last, so every persona variant of a
+    painting shares the longest possible prompt prefix.
+    """
+    if layout not in PROMPT_LAYOUTS:
+        raise ValueError(f"Unknown prompt layout: {layout}")
     base_prompt = """你是一位专业的艺术评论家。请仔细观察提供的图像，然后撰写一段约300-500字的艺术评论。
 
 你的评论应包括：
@@ -128,6 +266,13 @@ def construct_prompt(persona_text: str = "", knowledge_context: str = "") -> str
 
 请确保评论语言流畅，观点明确，分析具有深度。"""
     
+    if layout == "prefix_cache":
+        if knowledge_context:
+            base_prompt = f"{base_prompt}\n\n相关背景知识：\n{knowledge_context}"
+        if persona_text:
+            base_prompt = f"{base_prompt}\n\n{persona_text}"
+        return base_prompt
+    
     # Add persona if provided
     if persona_text:
         base_prompt = f"{persona_text}\n\n{base_prompt}"
@@ -139,6 +284,72 @@ def construct_prompt(persona_text: str = "", knowledge_context: str = "") -> str
     return base_prompt
 
 
+def build_critique_prompt(
+    image_path: str,
+    persona_text: str = "",
+    knowledge_base: Optional[Dict] = None,
+    retriever: Optional[KnowledgeRetriever] = None,
+    persona_name: Optional[str] = None,
+    prompt_layout: str = "persona_first"
+) -> str:
+    """
+    Build the full critique prompt for a painting, including knowledge context.
+    
+    Args:
+        image_path: Path to input image
+        persona_text: Persona description text
+        knowledge_base: Knowledge base dictionary
+        retriever: Knowledge retriever (takes precedence over knowledge_base)
+        persona_name: Persona name, used by the retriever to find critic notes
+        prompt_layout: 'persona_first' or 'prefix_cache'
+    
+    Returns:
+        Prompt text
+    """
+    # Extract relevant knowledge if provided
+    knowledge_context = ""
+    if retriever is not None:
+        painting = os.path.splitext(os.path.basename(image_path))[0].replace('_', ' ')
+        knowledge_context = retriever.build_context(f"{persona_text}\n{painting}", persona_name)
+    elif knowledge_base:
+        # Simple knowledge extraction (can be enhanced)
+        contexts = []
+        for category in knowledge_base.get('categories', []):
+            if 'content' in category:
+                contexts.append(category['content'][:200])  # Limit context length
+        knowledge_context = "\n".join(contexts)
+    
+    return construct_prompt(persona_text, knowledge_context, prompt_layout)
+
+
+def critique_path(image_path: str, output_dir: str) -> str:
+    """Timestamped critique file path named after its image."""
+    os.makedirs(output_dir, exist_ok=True)
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
+    base_name = os.path.splitext(os.path.basename(image_path))[0]
+    return os.path.join(
+        output_dir,
+        f"{base_name}_{timestamp}.txt"
+    )
+
+
+def save_critique(
+    critique_text: str,
+    image_path: str,
+    output_dir: str,
+    output_file: Optional[str] = None
+) -> str:
+    """
+    Save a critique as a timestamped text file named after its image.
+    
+    Returns:
+        Path of the written file
+    """
+    output_file = output_file or critique_path(image_path, output_dir)
+    with open(output_file, 'w', encoding='utf-8') as f:
+        f.write(critique_text)
+    print(f"✓ Critique saved to: {output_file}")
+    return output_file
 
 
 def generate_critique(
@@ -146,9 +357,18 @@ def generate_critique(
     model_name: str,
     persona_text: str = "",
     knowledge_base: Optional[Dict] = None,
-    api_endpoint: str = "http://localhost:8000/v1/chat/completions",
+    api_endpoint: Union[str, List[str]] = "http://localhost:8000/v1/chat/completions",
     model_params: Optional[Dict] = None,
-    output_dir: str = "outputs/critiques"
+    output_dir: str = "outputs/critiques",
+    cache: Optional[CritiqueCache] = None,
+    max_image_pixels: Optional[int] = None,
+    retry_policy: Optional[RetryPolicy] = None,
+    retriever: Optional[KnowledgeRetriever] = None,
+    persona_name: Optional[str] = None,
+    prompt_layout: str = "persona_first",
+    metrics: Optional[Dict[str, Any]] = None,
+    stream: bool = False,
+    idle_timeout: float = 30.0
 ) -> str:
     """
     Generate a critique for an image using MLLM.
@@ -158,47 +378,77 @@ def generate_critique(
         model_name: Model identifier
         persona_text: Persona description text
         knowledge_base: Knowledge base dictionary
-        api_endpoint: API endpoint URL
+        api_endpoint: API endpoint URL (a list load-balances across replicas)
         model_params: Model generation parameters
         output_dir: Directory to save generated critiques
-        
+        cache: Critique cache to consult before calling the API
+        max_image_pixels: Downscale the image to the model's vision resolution
+        retry_policy: Retry/hedging policy for transient API failures
+        retriever: Knowledge retriever selecting passages for this persona and
+            painting (takes precedence over knowledge_base)
+        persona_name: Persona name, used by the retriever to find critic notes
+        prompt_layout: 'persona_first' or 'prefix_cache' (image and shared
+            instructions first, persona last)
+        metrics: Dictionary updated with token usage of the API call
+        stream: Stream the response, writing text to ``<critique>.txt.part``
+            as it arrives (removed once the critique is saved or the call fails)
+        idle_timeout: When streaming, seconds without new data before the request fails
+    
     Returns:
         Generated critique text
     """
-    # Extract relevant knowledge if provided
-    knowledge_context = ""
-    if knowledge_base:
-        # Simple knowledge extraction (can be enhanced)
-        contexts = []
-        for category in knowledge_base.get('categories', []):
-            if 'content' in category:
-                contexts.append(category['content'][:200])  # Limit context length
-        knowledge_context = "\n".join(contexts)
+    # Construct prompt with relevant knowledge
+    full_prompt = build_critique_prompt(
+        image_path, persona_text, knowledge_base, retriever, persona_name, prompt_layout
+    )
     
-    # Construct prompt
-    full_prompt = construct_prompt(persona_text, knowledge_context)
+    # Reuse a cached critique for identical inputs
+    cache_key = None
+    critique_text = None
+    if cache is not None:
+        key_params = generation_params(model_params)
+        if max_image_pixels:
+            key_params['max_image_pixels'] = max_image_pixels
+        if prompt_layout != "persona_first":
+            key_params['prompt_layout'] = prompt_layout
+        cache_key = cache.make_key(image_path, full_prompt, model_name, key_params)
+        critique_text = cache.get(cache_key)
+        if critique_text is not None:
+            print(f"✓ Cache hit for {os.path.basename(image_path)}")
     
     # Generate critique
-    critique_text = call_mllm_api(
-        image_path=image_path,
-        prompt_text=full_prompt,
-        model_name=model_name,
-        api_endpoint=api_endpoint,
-        model_params=model_params
-    )
+    output_file = None
+    if critique_text is None:
+        stream_path = None
+        if stream and output_dir:
+            # Text streams into a side file, so a failed request never leaves
+            # a partial critique where analysis would pick it up
+            output_file = critique_path(image_path, output_dir)
+            stream_path = f"{output_file}.part"
+        try:
+            critique_text = call_mllm_api(
+                image_path=image_path,
+                prompt_text=full_prompt,
+                model_name=model_name,
+                api_endpoint=api_endpoint,
+                model_params=model_params,
+                max_image_pixels=max_image_pixels,
+                retry_policy=retry_policy,
+                image_first=prompt_layout == "prefix_cache",
+                metrics=metrics,
+                stream=stream,
+                idle_timeout=idle_timeout,
+                stream_path=stream_path
+            )
+        finally:
+            if stream_path and os.path.exists(stream_path):
+                os.remove(stream_path)
+        if cache is not None:
+            cache.put(cache_key, critique_text)
     
     # Save output if directory specified
     if output_dir:
-        os.makedirs(output_dir, exist_ok=True)
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        base_name = os.path.splitext(os.path.basename(image_path))[0]
-        output_file = os.path.join(
-            output_dir,
-            f"{base_name}_{timestamp}.txt"
-        )
-        with open(output_file, 'w', encoding='utf-8') as f:
-            f.write(critique_text)
-        print(f"✓ Critique saved to: {output_file}")
+        save_critique(critique_text, image_path, output_dir, output_file)
     
     return critique_text
 
@@ -212,6 +462,9 @@ def main():
     parser.add_argument("--persona", help="Path to persona file")
     parser.add_argument("--api", default="http://localhost:8000/v1/chat/completions", help="API endpoint")
     parser.add_argument("--output", default="outputs/critiques", help="Output directory")
+    parser.add_argument("--max-tokens", type=int, help="Maximum tokens per critique")
+    parser.add_argument("--temperature", type=float, help="Sampling temperature")
+    parser.add_argument("--top-p", type=float, help="Nucleus sampling top_p")
     
     args = parser.parse_args()
     
@@ -227,6 +480,7 @@ def main():
         model_name=args.model,
         persona_text=persona_text,
         api_endpoint=args.api,
+        model_params=GenerationParams(args.max_tokens, args.temperature, args.top_p).to_request(),
         output_dir=args.output
     )
     
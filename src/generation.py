@@ -0,0 +1,199 @@
+#!/usr/bin/env python
+"""
+VULCA Framework - Generation Parameters Module
+Validated generation-parameter schema and adaptive per-persona token budgets
+"""
+
+import math
+import threading
+from collections import deque
+from typing import Dict, Any, Optional, Tuple
+
+try:
+    from .retrieval import estimate_tokens
+except ImportError:  # Executed as a script from src/
+    from retrieval import estimate_tokens
+
+
+class GenerationParams:
+    """
+    Sampling parameters sent with every critique request.
+    
+    This is the single schema shared by the config loader, ``evaluate_painting``
+    and the CLI. ``max_new_tokens`` (the spelling used in
+    ``configs/model_config.yaml``) is accepted as an alias of ``max_tokens``.
+    """
+    
+    FIELDS = ('max_tokens', 'temperature', 'top_p')
+    ALIASES = {'max_new_tokens': 'max_tokens'}
+    
+    def __init__(
+        self,
+        max_tokens: Optional[int] = None,
+        temperature: Optional[float] = None,
+        top_p: Optional[float] = None
+    ):
+        """
+        Initialize and validate generation parameters (None leaves the server default).
+        
+        Args:
+            max_tokens: Maximum number of generated tokens
+            temperature: Sampling temperature
+            top_p: Nucleus sampling probability mass
+        """
+        if max_tokens is not None and (isinstance(max_tokens, bool) or int(max_tokens) != max_tokens
+                                       or max_tokens < 1):
+            raise ValueError(f"max_tokens must be a positive integer, got {max_tokens!r}")
+        if temperature is not None and not 0 <= temperature <= 2:
+            raise ValueError(f"temperature must be between 0 and 2, got {temperature!r}")
+        if top_p is not None and not 0 < top_p <= 1:
+            raise ValueError(f"top_p must be in (0, 1], got {top_p!r}")
+        self.max_tokens = int(max_tokens) if max_tokens is not None else None
+        self.temperature = float(temperature) if temperature is not None else None
+        self.top_p = float(top_p) if top_p is not None else None
+    
+    @classmethod
+    def from_config(cls, config: Optional[Dict[str, Any]], strict: bool = False) -> 'GenerationParams':
+        """
+        Read generation parameters from a model config section or params dict.
+        
+        Args:
+            config: Mapping with generation fields (aliases allowed)
+            strict: Reject keys that are not generation fields (for params
+                dicts; model config sections also hold name, endpoints, ...)
+        
+        Returns:
+            Validated generation parameters
+        """
+        values = {}
+        for key, value in (config or {}).items():
+            field = cls.ALIASES.get(key, key)
+            if field not in cls.FIELDS:
+                if strict:
+                    raise ValueError(f"Unknown generation parameter: {key}")
+                continue
+            if value is None:
+                continue
+            if field in values and values[field] != value:
+                raise ValueError(f"Conflicting values for {field}: {values[field]!r} and {value!r}")
+            values[field] = value
+        return cls(**values)
+    
+    def replace(self, **overrides) -> 'GenerationParams':
+        """Return a copy with the given fields replaced (None values are ignored)."""
+        values = self.to_request()
+        values.update({k: v for k, v in overrides.items() if v is not None})
+        return GenerationParams(**values)
+    
+    def to_request(self) -> Dict[str, Any]:
+        """Chat completion request fields for the parameters that are set."""
+        return {
+            field: getattr(self, field)
+            for field in self.FIELDS
+            if getattr(self, field) is not None
+        }
+    
+    def __repr__(self) -> str:
+        fields = ", ".join(f"{k}={v!r}" for k, v in self.to_request().items())
+        return f"GenerationParams({fields})"
+
+
+class AdaptiveTokenBudget:
+    """
+    Per-persona ``max_tokens`` caps learned from observed critique lengths.
+    
+    The prompt asks for 300-500 characters, but a 2048-token budget lets a
+    rambling model keep decoding (and occupying a batch slot) far past that.
+    After ``min_samples`` critiques from a persona, its budget becomes
+    ``headroom`` times the persona's 90th-percentile length, clamped to the
+    target range, converted to tokens with the persona's observed
+    tokens-per-character ratio. Budgets are rounded up to ``step`` tokens so
+    they stay stable (and critique cache keys keep matching) as samples arrive.
+    """
+    
+    def __init__(
+        self,
+        target_chars: Tuple[int, int] = (300, 500),
+        headroom: float = 1.5,
+        min_samples: int = 5,
+        min_tokens: int = 256,
+        step: int = 64,
+        window: int = 50
+    ):
+        """
+        Initialize the token budget controller.
+        
+        Args:
+            target_chars: Critique length range the prompt asks for, in characters
+            headroom: Multiplier on the length cap before converting to tokens
+            min_samples: Critiques observed per persona before capping its budget
+            min_tokens: Lower bound on any adaptive budget
+            step: Granularity budgets are rounded up to
+            window: Number of recent critiques kept per persona
+        """
+        if headroom < 1:
+            raise ValueError(f"headroom must be at least 1, got {headroom}")
+        self.target_chars = tuple(target_chars)
+        self.headroom = headroom
+        self.min_samples = min_samples
+        self.min_tokens = min_tokens
+        self.step = step
+        self.window = window
+        self._samples: Dict[Optional[str], deque] = {}
+        self._lock = threading.Lock()
+    
+    def record(self, persona: Optional[str], critique: str, completion_tokens: Optional[int] = None) -> None:
+        """
+        Record the length of a generated critique.
+        
+        Args:
+            persona: Persona name (None for baseline)
+            critique: Generated critique text
+            completion_tokens: Generated token count reported by the server
+                (estimated from the text when unavailable, e.g. cache hits)
+        """
+        if not critique:
+            return
+        tokens = completion_tokens or estimate_tokens(critique)
+        with self._lock:
+            samples = self._samples.setdefault(persona, deque(maxlen=self.window))
+            samples.append((len(critique), tokens))
+    
+    def budget(self, persona: Optional[str], max_tokens: Optional[int] = None) -> Optional[int]:
+        """
+        Token budget for the next critique of a persona.
+        
+        Args:
+            persona: Persona name (None for baseline)
+            max_tokens: Configured budget, which is never exceeded
+        
+        Returns:
+            Budget in tokens, or ``max_tokens`` until enough critiques are observed
+        """
+        with self._lock:
+            samples = list(self._samples.get(persona, ()))
+        if len(samples) < self.min_samples:
+            return max_tokens
+        
+        chars = sorted(c for c, _ in samples)
+        p90_chars = chars[int(0.9 * (len(chars) - 1))]
+        tokens_per_char = sum(t for _, t in samples) / max(1, sum(chars))
+        low, high = self.target_chars
+        cap_chars = self.headroom * min(high, max(low, p90_chars))
+        budget = math.ceil(cap_chars * tokens_per_char / self.step) * self.step
+        budget = max(self.min_tokens, budget)
+        return min(budget, max_tokens) if max_tokens else budget
+    
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """Observed critique counts, median lengths and current budgets per persona."""
+        with self._lock:
+            personas = {persona: list(samples) for persona, samples in self._samples.items()}
+        stats = {}
+        for persona, samples in personas.items():
+            chars = sorted(c for c, _ in samples)
+            stats[persona or 'baseline'] = {
+                'critiques': len(samples),
+                'median_chars': chars[len(chars) // 2],
+                'budget': self.budget(persona)
+            }
+        return stats
@@ -0,0 +1,109 @@
+#!/usr/bin/env python
+"""
+VULCA Framework - Job Journal Module
+Write-ahead journal that lets interrupted batch runs resume
+"""
+
+import os
+import json
+import hashlib
+import threading
+from datetime import datetime
+from typing import Dict, Any, Optional
+
+
+class JobJournal:
+    """
+    Append-only JSONL journal of (image, persona, model) evaluation jobs.
+    
+    Every status change is appended and fsynced before the caller moves on,
+    so after a crash the journal replays to the last known state of each job.
+    """
+    
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    
+    def __init__(self, path: str, resume: bool = True):
+        """
+        Open a job journal.
+        
+        Args:
+            path: Journal file path
+            resume: Replay an existing journal (False starts a fresh one and
+                keeps the old journal as ``<name>.<timestamp>.jsonl``)
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        if not resume and os.path.exists(path):
+            stem, extension = os.path.splitext(path)
+            backup = f"{stem}.{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}{extension}"
+            os.replace(path, backup)
+            print(f"Previous journal kept as: {backup}")
+        self.jobs = self._replay()
+    
+    @staticmethod
+    def job_id(image_path: str, persona: Optional[str], model_name: str) -> str:
+        """
+        Build a stable identifier for an evaluation job.
+        
+        The absolute image path is used, so paintings with the same file name
+        in different directories are different jobs.
+        """
+        key = json.dumps([os.path.abspath(image_path), persona, model_name], ensure_ascii=False)
+        return hashlib.sha1(key.encode('utf-8')).hexdigest()[:16]
+    
+    def _replay(self) -> Dict[str, Dict[str, Any]]:
+        """Rebuild the latest record of every job from the journal file."""
+        jobs = {}
+        if not os.path.exists(self.path):
+            return jobs
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    # Torn write from an interrupted run
+                    continue
+                jobs[entry['job_id']] = entry
+        return jobs
+    
+    def record(self, job_id: str, status: str, **fields) -> None:
+        """
+        Append a status change for a job.
+        
+        Args:
+            job_id: Job identifier
+            status: New job status
+            **fields: Additional fields to store (image, persona, result, error, ...)
+        """
+        entry = {
+            'job_id': job_id,
+            'status': status,
+            'time': datetime.now().isoformat(),
+            **fields
+        }
+        line = json.dumps(entry, ensure_ascii=False) + '\n'
+        with self._lock:
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(line)
+                f.flush()
+                os.fsync(f.fileno())
+            self.jobs[job_id] = entry
+    
+    def status(self, job_id: str) -> Optional[str]:
+        """Return the last recorded status of a job."""
+        return self.jobs.get(job_id, {}).get('status')
+    
+    def result(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Return the stored result of a completed job."""
+        job = self.jobs.get(job_id, {})
+        return job.get('result') if job.get('status') == self.DONE else None
+    
+    def summary(self) -> Dict[str, int]:
+        """Count jobs by status."""
+        counts = {}
+        for job in self.jobs.values():
+            counts[job['status']] = counts.get(job['status'], 0) + 1
+        return counts
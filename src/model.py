@@ -4,45 +4,871 @@ VULCA Framework - Model Interface Module
 Unified interface for different MLLMs
 """
 
-from typing import Dict, Any, Optional
+import base64
+import gzip
+import json
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Callable, Dict, Any, List, Optional, TypeVar, Union
+from urllib.parse import urlsplit
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import ReadTimeoutError
+
+
+T = TypeVar("T")
+
+
+class APIError(RuntimeError):
+    """HTTP error response from an MLLM API."""
+    
+    def __init__(self, message: str, status_code: Optional[int] = None, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+class RateLimiter:
+    """Token-bucket rate limiter shared by all threads calling one endpoint."""
+    
+    def __init__(self, rate: float, burst: Optional[int] = None):
+        """
+        Initialize rate limiter.
+        
+        Args:
+            rate: Sustained requests per second
+            burst: Maximum number of requests allowed at once (defaults to rate)
+        """
+        if rate <= 0:
+            raise ValueError(f"Rate limit must be positive, got {rate}")
+        self.rate = rate
+        self.capacity = burst or max(1, int(rate))
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+    
+    def acquire(self) -> None:
+        """Block until a request slot is available."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(
+                    self.capacity,
+                    self._tokens + (now - self._updated) * self.rate
+                )
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+_rate_limiters: Dict[str, RateLimiter] = {}
+_rate_limiters_lock = threading.Lock()
+
+
+def set_rate_limit(api_endpoint: str, rate: Optional[float], burst: Optional[int] = None) -> None:
+    """
+    Configure the request rate limit for an API endpoint.
+    
+    Args:
+        api_endpoint: API endpoint URL
+        rate: Requests per second (None removes the limit)
+        burst: Maximum burst size
+    """
+    with _rate_limiters_lock:
+        if rate is None:
+            _rate_limiters.pop(api_endpoint, None)
+        else:
+            _rate_limiters[api_endpoint] = RateLimiter(rate, burst)
+
+
+def get_rate_limiter(api_endpoint: str) -> Optional[RateLimiter]:
+    """Return the rate limiter configured for an endpoint, if any."""
+    with _rate_limiters_lock:
+        return _rate_limiters.get(api_endpoint)
+
+
+class RetryPolicy:
+    """
+    Retries with exponential backoff, a shared retry budget and optional hedging.
+    
+    One policy is shared by all threads of a run. Retries (and hedged
+    duplicates) are allowed while they stay below ``budget_min`` plus
+    ``budget_ratio`` times the number of requests, so a failing backend
+    cannot be flooded with retries. With ``hedge_quantile`` set, a
+    duplicate request is sent when the first has been outstanding longer
+    than that latency quantile of recent successful requests, and the
+    first response wins.
+    """
+    
+    RETRY_STATUS = (408, 429, 500, 502, 503, 504)
+    
+    def __init__(
+        self,
+        max_retries: int = 3,
+        backoff_base: float = 1.0,
+        backoff_max: float = 30.0,
+        budget_ratio: float = 0.2,
+        budget_min: int = 10,
+        hedge_quantile: Optional[float] = None,
+        hedge_min_samples: int = 20,
+        hedge_workers: int = 32,
+        latency_window: int = 200
+    ):
+        """
+        Initialize retry policy.
+        
+        Args:
+            max_retries: Retries per request after the first attempt (0 disables)
+            backoff_base: Delay cap in seconds for the first retry; doubles per retry
+            backoff_max: Maximum delay cap in seconds
+            budget_ratio: Retries allowed per request sent, across the run
+            budget_min: Retries always allowed regardless of request count
+            hedge_quantile: Latency quantile (e.g. 0.95) after which to hedge (None disables)
+            hedge_min_samples: Successful requests observed before hedging starts
+            hedge_workers: Maximum concurrent hedged sends
+            latency_window: Number of recent latencies kept for the quantile
+        """
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.budget_ratio = budget_ratio
+        self.budget_min = budget_min
+        self.hedge_quantile = hedge_quantile
+        self.hedge_min_samples = hedge_min_samples
+        self.requests = 0
+        self.retries = 0
+        self.hedges = 0
+        self._latencies = deque(maxlen=latency_window)
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=hedge_workers) if hedge_quantile else None
+    
+    @classmethod
+    def is_retryable(cls, error: Exception) -> bool:
+        """Whether an error is transient (timeout, connection failure, 5xx/429)."""
+        if isinstance(error, APIError):
+            return error.status_code in cls.RETRY_STATUS
+        return isinstance(error, (TimeoutError, ConnectionError))
+    
+    def backoff(self, attempt: int) -> float:
+        """Full-jitter delay before retry number ``attempt`` (0-based)."""
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+    
+    def _take_budget(self, hedge: bool = False) -> bool:
+        """Spend one unit of the retry budget on a retry or hedge, if any is left."""
+        with self._lock:
+            if self.retries + self.hedges >= self.budget_min + self.budget_ratio * self.requests:
+                return False
+            if hedge:
+                self.hedges += 1
+            else:
+                self.retries += 1
+            return True
+    
+    def _record_latency(self, latency: float) -> None:
+        """Add a successful request latency to the quantile window."""
+        with self._lock:
+            self._latencies.append(latency)
+    
+    def hedge_threshold(self) -> Optional[float]:
+        """Current hedging delay in seconds, or None while hedging is off."""
+        if not self.hedge_quantile:
+            return None
+        with self._lock:
+            if len(self._latencies) < self.hedge_min_samples:
+                return None
+            ordered = sorted(self._latencies)
+        return ordered[int(self.hedge_quantile * (len(ordered) - 1))]
+    
+    def _timed(self, send: Callable[[], T]) -> T:
+        """Run one send and record its latency on success."""
+        started = time.monotonic()
+        result = send()
+        self._record_latency(time.monotonic() - started)
+        return result
+    
+    def _start(self, send: Callable[[], T]) -> Future:
+        """Run a timed send on its own thread right away, returning its future."""
+        future = Future()
+        
+        def run():
+            future.set_running_or_notify_cancel()
+            try:
+                future.set_result(self._timed(send))
+            except BaseException as e:
+                future.set_exception(e)
+        
+        threading.Thread(target=run, daemon=True).start()
+        return future
+    
+    def _send(self, send: Callable[[], T], hedge: bool = True) -> T:
+        """Send once, hedging with a duplicate if the response is slow."""
+        threshold = self.hedge_threshold() if hedge else None
+        if threshold is None:
+            return self._timed(send)
+        
+        # The primary never queues behind other requests' hedges, so the
+        # threshold only measures the server's latency; duplicates share
+        # the bounded hedge executor
+        pending = {self._start(send)}
+        done, _ = wait(pending, timeout=threshold)
+        if not done and self._take_budget(hedge=True):
+            pending.add(self._executor.submit(self._timed, send))
+        
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    # The slower duplicate keeps running; its response is discarded
+                    return future.result()
+                error = error or future.exception()
+        raise error
+    
+    def call(self, send: Callable[[], T], hedge: bool = True) -> T:
+        """
+        Run a request with retries and hedging.
+        
+        Args:
+            send: Function performing one request attempt
+            hedge: Allow hedged duplicates (disable for sends with side effects,
+                such as streaming into a file)
+        
+        Returns:
+            Result of the first successful attempt
+        """
+        with self._lock:
+            self.requests += 1
+        for attempt in range(self.max_retries + 1):
+            try:
+                return self._send(send, hedge)
+            except Exception as e:
+                if (not self.is_retryable(e) or attempt == self.max_retries
+                        or not self._take_budget()):
+                    raise
+                delay = max(self.backoff(attempt), getattr(e, 'retry_after', None) or 0)
+                print(f"  Retrying in {delay:.1f}s after error: {e} ({attempt + 1}/{self.max_retries})")
+                time.sleep(delay)
+    
+    def stats(self) -> Dict[str, Any]:
+        """Request, retry and hedge counters."""
+        with self._lock:
+            return {'requests': self.requests, 'retries': self.retries, 'hedges': self.hedges}
+
+
+def build_chat_payload(
+    model_name: str,
+    prompt: str,
+    image_url: str,
+    image_first: bool = False,
+    **kwargs
+) -> Dict[str, Any]:
+    """
+    Build a chat completion request body with one image and one text prompt.
+    
+    Args:
+        model_name: Model identifier
+        prompt: Text prompt
+        image_url: Image URL, data URL or file:// URL
+        image_first: Place the image before the text
+        **kwargs: Additional request fields (max_tokens, temperature, ...)
+    
+    Returns:
+        Request payload
+    """
+    content = [
+        {"type": "text", "text": prompt},
+        {"type": "image_url", "image_url": {"url": image_url}}
+    ]
+    if image_first:
+        content.reverse()
+    payload = {
+        "model": model_name,
+        "messages": [{
+            "role": "user",
+            "content": content
+        }]
+    }
+    payload.update(kwargs)
+    return payload
 
 
 class MLLMInterface:
-    """Unified interface for MLLM APIs."""
+    """
+    Unified interface for OpenAI-compatible MLLM APIs.
     
-    def __init__(self, model_name: str, api_endpoint: str):
+    Owns a pooled keep-alive HTTP session so repeated requests reuse
+    connections instead of opening a new TCP connection per critique.
+    """
+    
+    def __init__(
+        self,
+        model_name: str,
+        api_endpoint: str,
+        pool_connections: int = 4,
+        pool_maxsize: int = 16,
+        timeout: float = 180,
+        compress: bool = False
+    ):
         """
         Initialize MLLM interface.
         
         Args:
             model_name: Model identifier
             api_endpoint: API endpoint URL
+            pool_connections: Number of host connection pools to cache
+            pool_maxsize: Maximum connections kept alive per host
+                (should be at least the batch max_in_flight)
+            timeout: Request timeout in seconds
+            compress: Gzip request bodies (server must accept Content-Encoding: gzip)
         """
         self.model_name = model_name
         self.api_endpoint = api_endpoint
+        self.timeout = timeout
+        self.compress = compress
+        
+        self.session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=pool_connections,
+            pool_maxsize=pool_maxsize
+        )
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers.update({
+            "Content-Type": "application/json",
+            "Connection": "keep-alive"
+        })
+    
+    def build_payload(
+        self,
+        prompt: str,
+        image_url: str,
+        image_first: bool = False,
+        **kwargs
+    ) -> Dict[str, Any]:
+        """
+        Build a chat completion payload with one image and one text prompt.
+        
+        Args:
+            prompt: Text prompt
+            image_url: Image URL or data URL
+            image_first: Place the image before the text, so requests for the
+                same image share a prefix the server can cache
+            **kwargs: Additional request fields (max_tokens, temperature, ...)
+        
+        Returns:
+            Request payload
+        """
+        return build_chat_payload(self.model_name, prompt, image_url, image_first, **kwargs)
+    
+    def chat(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Send a chat completion request over the pooled session.
+        
+        Args:
+            payload: Request payload
+        
+        Returns:
+            Decoded JSON response
+        """
+        limiter = get_rate_limiter(self.api_endpoint)
+        if limiter is not None:
+            limiter.acquire()
+        
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        headers = {}
+        if self.compress:
+            body = gzip.compress(body, compresslevel=5)
+            headers["Content-Encoding"] = "gzip"
+        
+        try:
+            response = self.session.post(
+                self.api_endpoint,
+                data=body,
+                headers=headers,
+                timeout=self.timeout
+            )
+            response.raise_for_status()
+            return response.json()
+        except requests.exceptions.Timeout:
+            raise TimeoutError(f"API request timed out after {self.timeout} seconds")
+        except requests.exceptions.ConnectionError as e:
+            raise ConnectionError(f"Failed to connect to API server: {e}")
+        except requests.exceptions.HTTPError as e:
+            retry_after = e.response.headers.get("Retry-After", "")
+            raise APIError(
+                f"HTTP error during API call: {e}",
+                status_code=e.response.status_code,
+                retry_after=float(retry_after) if retry_after.isdigit() else None
+            )
+    
+    def chat_stream(
+        self,
+        payload: Dict[str, Any],
+        on_delta: Optional[Callable[[str], None]] = None,
+        idle_timeout: float = 30.0
+    ) -> Dict[str, Any]:
+        """
+        Send a streaming (SSE) chat completion request.
+        
+        Instead of a limit on the whole request, the stream fails only when
+        no data arrives for ``idle_timeout`` seconds, so long critiques are
+        not mistaken for hung requests. The streamed chunks are assembled
+        into the same shape as a non-streaming response, with an added
+        ``timing`` entry (see ``stream_timing``).
+        
+        Args:
+            payload: Request payload
+            on_delta: Called with each piece of generated text as it arrives
+            idle_timeout: Maximum seconds without data before giving up
+        
+        Returns:
+            Assembled chat completion response
+        """
+        limiter = get_rate_limiter(self.api_endpoint)
+        if limiter is not None:
+            limiter.acquire()
+        
+        payload = dict(payload, stream=True, stream_options={"include_usage": True})
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        headers = {"Accept": "text/event-stream"}
+        if self.compress:
+            body = gzip.compress(body, compresslevel=5)
+            headers["Content-Encoding"] = "gzip"
+        
+        started = time.monotonic()
+        arrivals = []
+        pieces = []
+        usage = None
+        finish_reason = None
+        try:
+            with self.session.post(
+                self.api_endpoint,
+                data=body,
+                headers=headers,
+                timeout=(self.timeout, idle_timeout),
+                stream=True
+            ) as response:
+                response.raise_for_status()
+                # chunk_size=None yields data as soon as it arrives
+                for line in response.iter_lines(chunk_size=None):
+                    if not line.startswith(b"data:"):
+                        continue
+                    data = line[5:].strip()
+                    if data == b"[DONE]":
+                        break
+                    chunk = json.loads(data)
+                    usage = chunk.get('usage') or usage
+                    for choice in chunk.get('choices') or []:
+                        finish_reason = choice.get('finish_reason') or finish_reason
+                        delta = (choice.get('delta') or {}).get('content')
+                        if delta:
+                            arrivals.append(time.monotonic())
+                            pieces.append(delta)
+                            if on_delta is not None:
+                                on_delta(delta)
+        except requests.exceptions.Timeout:
+            raise TimeoutError(f"No response from API within {self.timeout} seconds")
+        except requests.exceptions.ConnectionError as e:
+            if e.args and isinstance(e.args[0], ReadTimeoutError):
+                raise TimeoutError(f"API stream idle for more than {idle_timeout} seconds")
+            raise ConnectionError(f"Failed to connect to API server: {e}")
+        except requests.exceptions.ChunkedEncodingError as e:
+            raise ConnectionError(f"API stream interrupted: {e}")
+        except requests.exceptions.HTTPError as e:
+            retry_after = e.response.headers.get("Retry-After", "")
+            raise APIError(
+                f"HTTP error during API call: {e}",
+                status_code=e.response.status_code,
+                retry_after=float(retry_after) if retry_after.isdigit() else None
+            )
+        
+        result = {
+            'choices': [{
+                'message': {'role': 'assistant', 'content': "".join(pieces)},
+                'finish_reason': finish_reason
+            }],
+            'timing': self.stream_timing(started, arrivals, (usage or {}).get('completion_tokens'))
+        }
+        if usage:
+            result['usage'] = usage
+        return result
+    
+    @staticmethod
+    def stream_timing(
+        started: float,
+        arrivals: List[float],
+        completion_tokens: Optional[int] = None
+    ) -> Dict[str, Optional[float]]:
+        """
+        Latency breakdown of a streamed response.
+        
+        Time to first token mostly reflects server-side queueing and prefill;
+        inter-token latency and tokens per second reflect decode speed.
+        
+        Args:
+            started: Monotonic time the request was sent
+            arrivals: Monotonic arrival times of the text chunks
+            completion_tokens: Generated token count reported by the server
+                (defaults to the number of chunks)
+        
+        Returns:
+            Dictionary with ttft, inter_token_latency, tokens_per_second and
+            total_time in seconds
+        """
+        timing = {
+            'ttft': None,
+            'inter_token_latency': None,
+            'tokens_per_second': None,
+            'total_time': time.monotonic() - started
+        }
+        if not arrivals:
+            return timing
+        timing['ttft'] = arrivals[0] - started
+        tokens = completion_tokens or len(arrivals)
+        decode_time = arrivals[-1] - arrivals[0]
+        if tokens > 1 and decode_time > 0:
+            timing['inter_token_latency'] = decode_time / (tokens - 1)
+            timing['tokens_per_second'] = (tokens - 1) / decode_time
+        return timing
+    
+    @staticmethod
+    def extract_text(result: Dict[str, Any]) -> str:
+        """Extract generated text from a chat completion response."""
+        if 'choices' in result and result['choices']:
+            return result['choices'][0]['message']['content'].strip()
+        raise ValueError(f"Unexpected API response format: {result}")
+    
+    @staticmethod
+    def extract_usage(result: Dict[str, Any]) -> Dict[str, Optional[int]]:
+        """
+        Extract token usage from a chat completion response.
+        
+        ``cached_tokens`` is the part of the prompt served from the server's
+        prefix cache (vLLM reports it with ``--enable-prompt-tokens-details``);
+        it is None when the server does not report it.
+        """
+        usage = result.get('usage') or {}
+        details = usage.get('prompt_tokens_details') or {}
+        return {
+            'prompt_tokens': usage.get('prompt_tokens'),
+            'completion_tokens': usage.get('completion_tokens'),
+            'cached_tokens': details.get('cached_tokens')
+        }
     
-    def generate(self, image_data: bytes, prompt: str, **kwargs) -> str:
+    def generate(self, image_data: bytes, prompt: str, mime_type: str = "image/jpeg", **kwargs) -> str:
         """
         Generate text from image and prompt.
         
         Args:
             image_data: Image bytes
             prompt: Text prompt
+            mime_type: MIME type of the image
             **kwargs: Additional parameters
-            
+        
         Returns:
             Generated text
         """
-        # Implementation would call appropriate API
-        pass
+        encoded = base64.b64encode(image_data).decode("utf-8")
+        payload = self.build_payload(prompt, f"data:{mime_type};base64,{encoded}", **kwargs)
+        return self.extract_text(self.chat(payload))
+    
+    def close(self) -> None:
+        """Close pooled connections."""
+        self.session.close()
+
+
+class EndpointPool:
+    """
+    Client-side load balancer over replicas of one model.
+    
+    Exposes the same request methods as ``MLLMInterface``. Each request is
+    routed to the healthy endpoint with the fewest requests in flight
+    ('least_outstanding') or the lowest expected wait, latency EWMA times
+    queue depth ('latency'). Endpoints that fail ``eject_after`` times in a
+    row are ejected for ``cooldown`` seconds and re-admitted only after
+    ``VLLMServer.check_server_status`` reports them healthy.
+    """
+    
+    STRATEGIES = ('least_outstanding', 'latency')
+    
+    def __init__(
+        self,
+        model_name: str,
+        api_endpoints: List[str],
+        strategy: str = 'least_outstanding',
+        eject_after: int = 3,
+        cooldown: float = 30.0,
+        ewma_alpha: float = 0.2,
+        **client_options
+    ):
+        """
+        Initialize the endpoint pool.
+        
+        Args:
+            model_name: Model identifier served by every endpoint
+            api_endpoints: Chat completion URLs of the replicas
+            strategy: 'least_outstanding' or 'latency'
+            eject_after: Consecutive failures before an endpoint is ejected
+            cooldown: Seconds an ejected endpoint waits before a health check
+            ewma_alpha: Weight of the newest sample in the latency average
+            **client_options: MLLMInterface options for each endpoint's client
+        """
+        if not api_endpoints:
+            raise ValueError("Endpoint pool needs at least one API endpoint")
+        if strategy not in self.STRATEGIES:
+            raise ValueError(f"Unknown routing strategy: {strategy}")
+        self.model_name = model_name
+        self.api_endpoints = list(api_endpoints)
+        self.strategy = strategy
+        self.eject_after = eject_after
+        self.cooldown = cooldown
+        self.ewma_alpha = ewma_alpha
+        
+        self.clients = {
+            endpoint: MLLMInterface(model_name, endpoint, **client_options)
+            for endpoint in self.api_endpoints
+        }
+        self._state = {
+            endpoint: {'outstanding': 0, 'latency': None, 'failures': 0,
+                       'ejected_until': 0.0, 'requests': 0}
+            for endpoint in self.api_endpoints
+        }
+        self._lock = threading.Lock()
+    
+    @staticmethod
+    def server_url(api_endpoint: str) -> str:
+        """Base server URL (scheme and host) of a chat completion endpoint."""
+        parts = urlsplit(api_endpoint)
+        return f"{parts.scheme}://{parts.netloc}"
+    
+    def _readmit(self) -> None:
+        """Health-check ejected endpoints whose cooldown has elapsed."""
+        now = time.monotonic()
+        with self._lock:
+            due = [
+                endpoint for endpoint, state in self._state.items()
+                if state['ejected_until'] and state['ejected_until'] <= now
+            ]
+            # Push the deadline out so concurrent callers do not probe the same endpoint
+            for endpoint in due:
+                self._state[endpoint]['ejected_until'] = now + self.cooldown
+        
+        for endpoint in due:
+            if VLLMServer.check_server_status(self.server_url(endpoint)):
+                with self._lock:
+                    self._state[endpoint].update(failures=0, ejected_until=0.0)
+                print(f"✓ Endpoint re-admitted: {endpoint}")
+    
+    def _acquire(self, exclude: set) -> str:
+        """Pick an endpoint for the next request and count it as outstanding."""
+        self._readmit()
+        with self._lock:
+            candidates = [
+                e for e in self.api_endpoints
+                if not self._state[e]['ejected_until'] and e not in exclude
+            ]
+            if not candidates:
+                # Everything is ejected: try the endpoint closest to re-admission
+                candidates = sorted(
+                    (e for e in self.api_endpoints if e not in exclude),
+                    key=lambda e: self._state[e]['ejected_until']
+                )[:1]
+            if not candidates:
+                raise ConnectionError("No API endpoints left to try")
+            
+            def load(endpoint):
+                state = self._state[endpoint]
+                if self.strategy == 'latency':
+                    # Unmeasured endpoints look free so they receive traffic
+                    return (state['outstanding'] + 1) * (state['latency'] or 0.0), state['requests']
+                return state['outstanding'], state['latency'] or 0.0, state['requests']
+            
+            endpoint = min(candidates, key=load)
+            self._state[endpoint]['outstanding'] += 1
+            self._state[endpoint]['requests'] += 1
+            return endpoint
+    
+    def _release(self, endpoint: str, latency: Optional[float] = None, failed: bool = False) -> None:
+        """
+        Record the outcome of a request.
+        
+        Args:
+            endpoint: Endpoint the request was sent to
+            latency: Latency of a successful request
+            failed: Whether the endpoint failed (neither is set for requests
+                the server rejected, e.g. with a 400, which say nothing about its health)
+        """
+        with self._lock:
+            state = self._state[endpoint]
+            state['outstanding'] -= 1
+            if failed:
+                state['failures'] += 1
+                if state['failures'] >= self.eject_after and not state['ejected_until']:
+                    state['ejected_until'] = time.monotonic() + self.cooldown
+                    print(f"✗ Endpoint ejected after {state['failures']} failures: {endpoint}")
+            elif latency is not None:
+                state['failures'] = 0
+                state['latency'] = latency if state['latency'] is None else (
+                    self.ewma_alpha * latency + (1 - self.ewma_alpha) * state['latency']
+                )
+    
+    def build_payload(self, prompt: str, image_url: str, image_first: bool = False, **kwargs) -> Dict[str, Any]:
+        """Build a chat completion payload (see ``MLLMInterface.build_payload``)."""
+        return self.clients[self.api_endpoints[0]].build_payload(prompt, image_url, image_first, **kwargs)
+    
+    def chat(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Send a chat completion request to the best available endpoint.
+        
+        Requests that could not connect are retried on another endpoint,
+        since the server never saw them; other errors are raised.
+        
+        Args:
+            payload: Request payload
+        
+        Returns:
+            Decoded JSON response
+        """
+        tried = set()
+        while True:
+            endpoint = self._acquire(tried)
+            started = time.monotonic()
+            try:
+                result = self.clients[endpoint].chat(payload)
+            except ConnectionError:
+                self._release(endpoint, failed=True)
+                tried.add(endpoint)
+                if len(tried) == len(self.api_endpoints):
+                    raise
+                continue
+            except Exception as e:
+                # Only transient errors count toward ejection, not rejected requests
+                self._release(endpoint, failed=RetryPolicy.is_retryable(e))
+                raise
+            self._release(endpoint, time.monotonic() - started)
+            return result
+    
+    def chat_stream(
+        self,
+        payload: Dict[str, Any],
+        on_delta: Optional[Callable[[str], None]] = None,
+        idle_timeout: float = 30.0
+    ) -> Dict[str, Any]:
+        """
+        Send a streaming chat completion request to the best available endpoint.
+        
+        Like ``chat``, connection failures move on to another endpoint, but
+        only while no text has been streamed yet.
+        
+        Args:
+            payload: Request payload
+            on_delta: Called with each piece of generated text as it arrives
+            idle_timeout: Maximum seconds without data before giving up
+        
+        Returns:
+            Assembled chat completion response
+        """
+        tried = set()
+        streamed = []
+        
+        def forward(delta):
+            streamed.append(True)
+            if on_delta is not None:
+                on_delta(delta)
+        
+        while True:
+            endpoint = self._acquire(tried)
+            started = time.monotonic()
+            try:
+                result = self.clients[endpoint].chat_stream(payload, forward, idle_timeout)
+            except ConnectionError:
+                self._release(endpoint, failed=True)
+                tried.add(endpoint)
+                if streamed or len(tried) == len(self.api_endpoints):
+                    raise
+                continue
+            except Exception as e:
+                # Only transient errors count toward ejection, not rejected requests
+                self._release(endpoint, failed=RetryPolicy.is_retryable(e))
+                raise
+            # Route on time to first token: decode time depends on critique length
+            self._release(endpoint, result['timing']['ttft'] or time.monotonic() - started)
+            return result
+    
+    extract_text = staticmethod(MLLMInterface.extract_text)
+    extract_usage = staticmethod(MLLMInterface.extract_usage)
+    
+    def generate(self, image_data: bytes, prompt: str, mime_type: str = "image/jpeg", **kwargs) -> str:
+        """Generate text from image and prompt (see ``MLLMInterface.generate``)."""
+        encoded = base64.b64encode(image_data).decode("utf-8")
+        payload = self.build_payload(prompt, f"data:{mime_type};base64,{encoded}", **kwargs)
+        return self.extract_text(self.chat(payload))
+    
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """Snapshot of per-endpoint routing state."""
+        with self._lock:
+            return {endpoint: dict(state) for endpoint, state in self._state.items()}
+    
+    def close(self) -> None:
+        """Close pooled connections of every endpoint."""
+        for client in self.clients.values():
+            client.close()
+
+
+_clients: Dict[tuple, Union[MLLMInterface, EndpointPool]] = {}
+_clients_lock = threading.Lock()
+
+# Options that only apply to EndpointPool and are dropped for single endpoints
+_POOL_OPTIONS = ('strategy', 'eject_after', 'cooldown', 'ewma_alpha')
+
+
+def get_client(
+    model_name: str,
+    api_endpoint: Union[str, List[str]],
+    **options
+) -> Union[MLLMInterface, EndpointPool]:
+    """
+    Return the shared client for a model/endpoint pair, creating it on first use.
+    
+    Options only apply when the client is created; configure clients up front
+    (e.g. from ``VULCA.__init__``) to control pool sizes and compression.
+    A list of several endpoints yields a load-balancing ``EndpointPool``.
+    
+    Args:
+        model_name: Model identifier
+        api_endpoint: API endpoint URL, or a list of replica URLs
+        **options: MLLMInterface (or EndpointPool) constructor options
+    
+    Returns:
+        Shared MLLMInterface or EndpointPool instance
+    """
+    if not isinstance(api_endpoint, str):
+        endpoints = tuple(api_endpoint)
+        api_endpoint = endpoints[0] if len(endpoints) == 1 else endpoints
+    key = (model_name, api_endpoint)
+    with _clients_lock:
+        client = _clients.get(key)
+        if client is None:
+            if isinstance(api_endpoint, tuple):
+                client = EndpointPool(model_name, list(api_endpoint), **options)
+            else:
+                options = {k: v for k, v in options.items() if k not in _POOL_OPTIONS}
+                client = MLLMInterface(model_name, api_endpoint, **options)
+            _clients[key] = client
+        return client
 
 
 class VLLMServer:
     """Manager for vLLM server."""
     
     @staticmethod
-    def start_server(model_name: str, port: int = 8000) -> None:
+    def start_server(model_name: str, port: int = 8000, enable_prefix_caching: bool = True) -> None:
         """Start vLLM server with specified model."""
         import subprocess
         cmd = [
@@ -52,13 +878,16 @@ class VLLMServer:
             "--trust-remote-code",
             "--max-model-len", "16384"
         ]
+        if enable_prefix_caching:
+            # Reuse image/instruction prefill across personas and report cached tokens
+            cmd += ["--enable-prefix-caching", "--enable-prompt-tokens-details"]
         subprocess.Popen(cmd)
     
     @staticmethod
-    def check_server_status(url: str = "http://localhost:8000") -> bool:
+    def check_server_status(url: str = "http://localhost:8000", timeout: float = 5) -> bool:
         """Check if vLLM server is running."""
         try:
-            response = requests.get(f"{url}/health")
+            response = requests.get(f"{url}/health", timeout=timeout)
             return response.status_code == 200
         except:
             return False
\ No newline at end of file
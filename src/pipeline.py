@@ -30,16 +30,12 @@ def setup_paths(config_path: str = "configs/hyperparams.yaml") -> Dict[str, Path
     }
 
 
-def run_preprocessing(image_dir: str, output_dir: str) -> None:
+def run_preprocessing(image_dir: str, output_dir: str, workers: int = 1) -> None:
     """Run image preprocessing with adaptive sliding window."""
-    logging.info("Starting image preprocessing...")
-    from preprocess import process_image
-    import os
-    # Process each image in the directory
-    for image_file in os.listdir(image_dir):
-        if image_file.lower().endswith(('.jpg', '.jpeg', '.png', '.webp')):
-            image_path = os.path.join(image_dir, image_file)
-            process_image(image_path, output_dir)
+    logging.info(f"Starting image preprocessing with {workers} worker(s)...")
+    from preprocess import process_directory
+    # Process each image in the directory, isolating per-image errors
+    process_directory(image_dir, output_dir, workers=workers)
     logging.info("Image preprocessing complete")
 
 
@@ -67,9 +63,8 @@ def run_evaluation(images_dir: str, model_name: str, personas_dir: str) -> None:
 def run_analysis(critiques_dir: str, output_dir: str) -> None:
     """Run semantic analysis on generated critiques."""
     logging.info("Starting semantic analysis...")
-    from analyze import analyze_critiques
+    from analyze import analyze_critiques, save_analysis
     import os
-    import json
     
     # Load all critiques from directory
     critiques = []
@@ -83,8 +78,7 @@ def run_analysis(critiques_dir: str, output_dir: str) -> None:
     # Save results
     os.makedirs(output_dir, exist_ok=True)
     output_file = os.path.join(output_dir, "analysis_results.json")
-    with open(output_file, 'w', encoding='utf-8') as f:
-        json.dump(results, f, ensure_ascii=False, indent=2)
+    save_analysis(results, output_file)
     
     logging.info("Analysis complete")
 
@@ -107,7 +101,8 @@ def run_full_pipeline(args):
     else:
         run_preprocessing(
             args.image_dir or str(paths['data_dir'] / 'images'),
-            str(paths['outputs_dir'] / 'processed_images')
+            str(paths['outputs_dir'] / 'processed_images'),
+            workers=args.workers
         )
     
     # Phase 2: Evaluation
@@ -157,6 +152,12 @@ def main():
         type=str,
         help="Directory containing input images"
     )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Worker processes for preprocessing"
+    )
     parser.add_argument(
         "--skip_preprocessing",
         action="store_true",
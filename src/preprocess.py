@@ -6,11 +6,23 @@ Simplified version based on noAI1.5.py
 """
 
 import os
+import shutil
+import tempfile
 import cv2
 import numpy as np
-from typing import List, Tuple, Optional
+from typing import Dict, Any, Iterator, List, Tuple, Optional
 from skimage.feature import local_binary_pattern
 
+try:
+    from .tiling import image_size, open_image, open_pyramid, pyramid_factors, warm_cache
+except ImportError:  # Executed as a script from src/
+    from tiling import image_size, open_image, open_pyramid, pyramid_factors, warm_cache
+
+
+LBP_RADIUS = 1
+LBP_POINTS = 8 * LBP_RADIUS
+LBP_BINS = LBP_POINTS + 2
+
 
 def calculate_saliency(image: np.ndarray) -> float:
     """
@@ -35,10 +47,8 @@ def calculate_saliency(image: np.ndarray) -> float:
     edge_density = np.mean(edge_magnitude) / 255.0
     
     # Texture analysis using LBP
-    radius = 1
-    n_points = 8 * radius
-    lbp = local_binary_pattern(gray, n_points, radius, method='uniform')
-    lbp_hist, _ = np.histogram(lbp.ravel(), bins=n_points + 2, range=(0, n_points + 2))
+    lbp = local_binary_pattern(gray, LBP_POINTS, LBP_RADIUS, method='uniform')
+    lbp_hist, _ = np.histogram(lbp.ravel(), bins=LBP_BINS, range=(0, LBP_BINS))
     lbp_hist = lbp_hist.astype("float")
     lbp_hist /= (lbp_hist.sum() + 1e-6)
     texture_complexity = -np.sum(lbp_hist * np.log2(lbp_hist + 1e-6))
@@ -48,116 +58,597 @@ def calculate_saliency(image: np.ndarray) -> float:
     return min(max(saliency, 0.0), 1.0)
 
 
-def adaptive_sliding_window(
+SALIENCY_STRIP_PIXELS = 4 * 1024 * 1024
+
+
+def saliency_strip_height(width: int, cell_size: int = 16, strip_pixels: int = SALIENCY_STRIP_PIXELS) -> int:
+    """Rows per saliency processing strip: a multiple of the cell size within the pixel budget."""
+    return max(cell_size, (strip_pixels // max(width, 1)) // cell_size * cell_size)
+
+
+def saliency_cells(
     image: np.ndarray,
+    rows: Optional[Tuple[int, int]] = None,
+    cell_size: int = 16,
+    strip_pixels: int = SALIENCY_STRIP_PIXELS
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Per-cell Sobel edge sums and uniform LBP code counts of a band of rows.
+    
+    The image is processed in horizontal strips of ``saliency_strip_height``
+    rows, each read with a 1px halo for the 3x3 operators. A band that starts
+    on a strip boundary sees exactly the strips the whole image would, so
+    bands computed independently (e.g. in worker processes) concatenate into
+    the statistics of the whole image.
+    
+    Args:
+        image: Input image array
+        rows: (y0, y1) band to compute, with y0 a multiple of the strip
+            height and y1 another multiple or the image height (all rows if None)
+        cell_size: Side of the cells statistics are aggregated over
+        strip_pixels: Approximate pixel budget per processing strip,
+            bounding the memory used for intermediate feature maps
+        
+    Returns:
+        tuple: (edge sums of shape (rows, cols), LBP counts of shape (rows, cols, LBP_BINS))
+    """
+    height, width = image.shape[:2]
+    y0, y1 = rows or (0, height)
+    n_rows = -(-(y1 - y0) // cell_size)
+    n_cols = -(-width // cell_size)
+    
+    edge_cells = np.zeros((n_rows, n_cols), dtype=np.float64)
+    lbp_cells = np.zeros((n_rows, n_cols, LBP_BINS), dtype=np.int64)
+    col_starts = np.arange(0, width, cell_size)
+    
+    strip_height = saliency_strip_height(width, cell_size, strip_pixels)
+    for s0 in range(y0, y1, strip_height):
+        s1 = min(y1, s0 + strip_height)
+        a0, a1 = max(0, s0 - 1), min(height, s1 + 1)
+        strip = image[a0:a1]
+        if len(strip.shape) == 3:
+            gray = cv2.cvtColor(np.ascontiguousarray(strip), cv2.COLOR_BGR2GRAY)
+        else:
+            gray = np.ascontiguousarray(strip)
+        
+        sobelx = cv2.Sobel(gray, cv2.CV_32F, 1, 0, ksize=3)
+        sobely = cv2.Sobel(gray, cv2.CV_32F, 0, 1, ksize=3)
+        # Correctly rounded, unlike cv2.magnitude's approximation, so cell
+        # sums are reproducible wherever a strip lands in memory
+        edge_magnitude = np.sqrt(sobelx**2 + sobely**2)[s0 - a0:s1 - a0]
+        lbp = local_binary_pattern(gray, LBP_POINTS, LBP_RADIUS, method='uniform')
+        lbp = lbp[s0 - a0:s1 - a0].astype(np.uint8)
+        
+        row_starts = np.arange(0, s1 - s0, cell_size)
+        r0 = (s0 - y0) // cell_size
+        r1 = r0 + len(row_starts)
+        edge_cells[r0:r1] = np.add.reduceat(
+            np.add.reduceat(edge_magnitude, row_starts, axis=0, dtype=np.float64),
+            col_starts, axis=1
+        )
+        for code in range(LBP_BINS):
+            mask = (lbp == code).astype(np.int32)
+            lbp_cells[r0:r1, :, code] = np.add.reduceat(
+                np.add.reduceat(mask, row_starts, axis=0), col_starts, axis=1
+            )
+    return edge_cells, lbp_cells
+
+
+class SaliencyMap:
+    """
+    Whole-image saliency statistics for O(1) window queries.
+    
+    Sobel edge magnitude and uniform LBP codes are computed once per image,
+    reduced to ``cell_size`` cells and stored as summed-area tables, so the
+    saliency of any window is read from a handful of table lookups instead of
+    recomputing gradients and textures over every overlapping patch. Window
+    edges are snapped to the cell grid.
+    """
+    
+    def __init__(self, image: np.ndarray, cell_size: int = 16, strip_pixels: int = SALIENCY_STRIP_PIXELS):
+        """
+        Compute saliency tables for an image.
+        
+        Args:
+            image: Input image array
+            cell_size: Side of the cells statistics are aggregated over
+            strip_pixels: Approximate pixel budget per processing strip,
+                bounding the memory used for intermediate feature maps
+        """
+        self._build(*saliency_cells(image, None, cell_size, strip_pixels), cell_size)
+    
+    @classmethod
+    def from_cells(cls, edge_cells: np.ndarray, lbp_cells: np.ndarray, cell_size: int = 16) -> 'SaliencyMap':
+        """
+        Build a map from precomputed cell statistics (see ``saliency_cells``).
+        
+        Args:
+            edge_cells: Edge magnitude sums per cell
+            lbp_cells: LBP code counts per cell
+            cell_size: Side of the cells
+            
+        Returns:
+            Saliency map of the image the cells cover
+        """
+        saliency_map = cls.__new__(cls)
+        saliency_map._build(edge_cells, lbp_cells, cell_size)
+        return saliency_map
+    
+    def _build(self, edge_cells: np.ndarray, lbp_cells: np.ndarray, cell_size: int) -> None:
+        """Store the cell grid and its summed-area tables."""
+        self.cell_size = cell_size
+        self.rows, self.cols = edge_cells.shape
+        self.edge_table = self._summed_area(edge_cells)
+        self.lbp_table = self._summed_area(lbp_cells)
+    
+    @staticmethod
+    def _summed_area(cells: np.ndarray) -> np.ndarray:
+        """Build a zero-padded summed-area table over the first two axes."""
+        table = np.zeros((cells.shape[0] + 1, cells.shape[1] + 1) + cells.shape[2:], dtype=cells.dtype)
+        table[1:, 1:] = cells.cumsum(axis=0).cumsum(axis=1)
+        return table
+    
+    def _region_sum(self, table: np.ndarray, r0: int, c0: int, r1: int, c1: int):
+        """Sum of cells in [r0, r1) x [c0, c1)."""
+        return table[r1, c1] - table[r0, c1] - table[r1, c0] + table[r0, c0]
+    
+    def window_saliency(self, x: int, y: int, width: int, height: Optional[int] = None) -> float:
+        """
+        Saliency score of a window, matching ``calculate_saliency``.
+        
+        Args:
+            x: Left edge of the window
+            y: Top edge of the window
+            width: Window width
+            height: Window height (defaults to width)
+            
+        Returns:
+            Saliency score between 0 and 1
+        """
+        height = width if height is None else height
+        c0 = min(self.cols - 1, int(round(x / self.cell_size)))
+        r0 = min(self.rows - 1, int(round(y / self.cell_size)))
+        c1 = min(self.cols, max(c0 + 1, int(round((x + width) / self.cell_size))))
+        r1 = min(self.rows, max(r0 + 1, int(round((y + height) / self.cell_size))))
+        
+        lbp_hist = self._region_sum(self.lbp_table, r0, c0, r1, c1).astype("float")
+        n_pixels = lbp_hist.sum()
+        edge_density = self._region_sum(self.edge_table, r0, c0, r1, c1) / max(n_pixels, 1) / 255.0
+        
+        lbp_hist /= (n_pixels + 1e-6)
+        texture_complexity = -np.sum(lbp_hist * np.log2(lbp_hist + 1e-6))
+        
+        saliency = 0.6 * edge_density + 0.4 * (texture_complexity / 4.0)
+        return min(max(float(saliency), 0.0), 1.0)
+
+
+DEFAULT_STRIDE_FACTORS = {'low': 0.9, 'medium': 0.75, 'high': 0.5}
+
+
+def schedule_windows(
+    saliency_map: SaliencyMap,
+    height: int,
+    width: int,
     window_sizes: List[int] = [2560, 1280, 640],
-    output_size: int = 640,
     saliency_threshold_low: float = 0.25,
-    saliency_threshold_high: float = 0.6
-) -> List[np.ndarray]:
+    saliency_threshold_high: float = 0.6,
+    stride_factors: Optional[Dict[str, float]] = None
+) -> Tuple[List[Tuple[int, int, int, float]], Dict[str, Any]]:
     """
-    Apply adaptive sliding window to extract image patches.
+    Plan window positions with a saliency-driven stride.
+    
+    Each step along a row advances by ``window_size * stride_factor``, where
+    the factor is chosen from the saliency of the window just visited: low
+    information regions are skipped quickly, high information regions are
+    sampled densely. Rows advance by the smallest factor seen in the row so
+    salient regions are never stepped over vertically.
     
     Args:
-        image: Input image
+        saliency_map: Precomputed saliency tables for the image
+        height: Image height
+        width: Image width
         window_sizes: List of window sizes to try
-        output_size: Output size for all patches
         saliency_threshold_low: Low saliency threshold
         saliency_threshold_high: High saliency threshold
+        stride_factors: Stride as a fraction of the window size for
+            'low', 'medium' and 'high' saliency windows
         
     Returns:
-        List of extracted and resized patches
+        tuple: (list of (x, y, window_size, saliency), scheduling statistics)
     """
-    height, width = image.shape[:2]
-    patches = []
+    factors = dict(DEFAULT_STRIDE_FACTORS)
+    factors.update(stride_factors or {})
     
+    windows = []
+    uniform_count = 0
     for window_size in window_sizes:
         # Skip if window is larger than image
         if window_size > min(height, width):
             continue
         
-        # Calculate stride based on window size
-        base_stride = int(window_size * 0.75)  # Default 75% overlap
+        # Patches a uniform grid at the medium stride would have produced
+        base_stride = max(1, int(window_size * factors['medium']))
+        uniform_count += (
+            len(range(0, height - window_size + 1, base_stride)) *
+            len(range(0, width - window_size + 1, base_stride))
+        )
         
-        # Sliding window
-        for y in range(0, height - window_size + 1, base_stride):
-            for x in range(0, width - window_size + 1, base_stride):
-                # Extract patch
-                patch = image[y:y+window_size, x:x+window_size]
-                
-                # Calculate saliency
-                saliency = calculate_saliency(patch)
+        y = 0
+        while y <= height - window_size:
+            x = 0
+            row_factor = factors['low']
+            while x <= width - window_size:
+                saliency = saliency_map.window_saliency(x, y, window_size)
+                windows.append((x, y, window_size, saliency))
                 
                 # Adaptive stride based on saliency
                 if saliency < saliency_threshold_low:
                     # Low information, larger stride
-                    stride_factor = 0.9
+                    stride_factor = factors['low']
                 elif saliency > saliency_threshold_high:
                     # High information, smaller stride
-                    stride_factor = 0.5
+                    stride_factor = factors['high']
                 else:
                     # Medium information
-                    stride_factor = 0.75
+                    stride_factor = factors['medium']
                 
-                # Resize to output size
-                resized = cv2.resize(patch, (output_size, output_size))
-                patches.append(resized)
+                row_factor = min(row_factor, stride_factor)
+                x += max(1, int(window_size * stride_factor))
+            y += max(1, int(window_size * row_factor))
+    
+    stats = {
+        'patches': len(windows),
+        'uniform_patches': uniform_count,
+        'saved_patches': uniform_count - len(windows),
+        'saved_ratio': (uniform_count - len(windows)) / uniform_count if uniform_count else 0.0
+    }
+    return windows, stats
+
+
+def iter_patches(
+    image: np.ndarray,
+    window_sizes: List[int] = [2560, 1280, 640],
+    output_size: int = 640,
+    saliency_threshold_low: float = 0.25,
+    saliency_threshold_high: float = 0.6,
+    stride_factors: Optional[Dict[str, float]] = None,
+    stats: Optional[Dict[str, Any]] = None
+) -> Iterator[Tuple[Tuple[int, int], int, float, np.ndarray]]:
+    """
+    Lazily extract image patches with adaptive sliding window.
+    
+    Windows are scheduled up front (only coordinates are kept), and each
+    patch is cropped and resized when it is requested, so peak memory is one
+    window rather than the whole patch set.
+    
+    Args:
+        image: Input image
+        window_sizes: List of window sizes to try
+        output_size: Output size for all patches
+        saliency_threshold_low: Low saliency threshold
+        saliency_threshold_high: High saliency threshold
+        stride_factors: Stride fractions for 'low', 'medium' and 'high' saliency
+        stats: Optional dict filled with scheduling statistics
+        
+    Yields:
+        tuple: ((x, y), window_size, saliency, resized_patch)
+    """
+    height, width = image.shape[:2]
+    saliency_map = SaliencyMap(image)
+    windows, schedule_stats = schedule_windows(
+        saliency_map, height, width, window_sizes,
+        saliency_threshold_low, saliency_threshold_high, stride_factors
+    )
+    del saliency_map
+    if stats is not None:
+        stats.update(schedule_stats)
     
-    return patches
+    yield from _crop_windows(image, windows, output_size)
+
+
+def _crop_windows(
+    image: np.ndarray,
+    windows: List[Tuple[int, int, int, float]],
+    output_size: int = 640,
+    pyramid: Optional[Dict[int, np.ndarray]] = None
+) -> Iterator[Tuple[Tuple[int, int], int, float, np.ndarray]]:
+    """
+    Crop and resize scheduled windows one at a time.
+    
+    With a ``pyramid`` of the image, large windows are cropped from the
+    coarsest level that still has at least ``output_size`` pixels across the
+    window.
+    """
+    factors = sorted(pyramid or {1: image})
+    for x, y, window_size, saliency in windows:
+        # Extract from the coarsest sufficient level and resize to output size
+        factor = max(f for f in factors if f == 1 or f * output_size <= window_size)
+        if factor == 1:
+            patch = image[y:y+window_size, x:x+window_size]
+        else:
+            level_x, level_y = x // factor, y // factor
+            level_size = window_size // factor
+            patch = pyramid[factor][level_y:level_y+level_size, level_x:level_x+level_size]
+        resized = cv2.resize(np.ascontiguousarray(patch), (output_size, output_size))
+        yield (x, y), window_size, saliency, resized
+
+
+def adaptive_sliding_window(
+    image: np.ndarray,
+    window_sizes: List[int] = [2560, 1280, 640],
+    output_size: int = 640,
+    saliency_threshold_low: float = 0.25,
+    saliency_threshold_high: float = 0.6,
+    stride_factors: Optional[Dict[str, float]] = None,
+    stats: Optional[Dict[str, Any]] = None
+) -> List[np.ndarray]:
+    """
+    Apply adaptive sliding window to extract image patches.
+    
+    Materializes ``iter_patches``; prefer the iterator for large images.
+    
+    Args:
+        image: Input image
+        window_sizes: List of window sizes to try
+        output_size: Output size for all patches
+        saliency_threshold_low: Low saliency threshold
+        saliency_threshold_high: High saliency threshold
+        stride_factors: Stride fractions for 'low', 'medium' and 'high' saliency
+        stats: Optional dict filled with scheduling statistics
+        
+    Returns:
+        List of extracted and resized patches
+    """
+    patch_stream = iter_patches(
+        image, window_sizes, output_size, saliency_threshold_low,
+        saliency_threshold_high, stride_factors, stats
+    )
+    return [patch for _, _, _, patch in patch_stream]
+
+
+_SCHEDULE_PARAMS = ('window_sizes', 'saliency_threshold_low', 'saliency_threshold_high', 'stride_factors')
+
+
+def iter_image_patches(
+    image_path: str,
+    region: Optional[Tuple[int, int, int, int]] = None,
+    stats: Optional[Dict[str, Any]] = None,
+    cache_dir: Optional[str] = None,
+    windows: Optional[List[Tuple[int, int, int, float]]] = None,
+    **kwargs
+) -> Iterator[Tuple[Tuple[int, int], int, float, np.ndarray]]:
+    """
+    Read an image and stream its adaptive sliding window patches.
+    
+    With ``cache_dir`` the decoded image and a downscaled pyramid for the
+    requested window scales are cached as memory-mapped ``.npy`` files, so
+    repeated runs skip decoding and each window only reads the pages it
+    covers at the scale it needs.
+    
+    Args:
+        image_path: Path to input image
+        region: Only extract windows whose origin lies in this (x0, y0, x1, y1)
+            box; windows are always scheduled over the whole image
+        stats: Optional dict filled with scheduling statistics
+        cache_dir: Directory for memory-mapped decode and pyramid caches
+        windows: Precomputed whole-image schedule (see ``process_directory``)
+        **kwargs: Additional parameters for iter_patches
+        
+    Yields:
+        tuple: ((x, y), window_size, saliency, resized_patch) in image coordinates
+    """
+    # Read image (memory-mapped when cached)
+    image = open_image(image_path, cache_dir)
+    pyramid = None
+    if cache_dir:
+        pyramid = open_pyramid(
+            image_path, image,
+            pyramid_factors(kwargs.get('window_sizes', [2560, 1280, 640]), kwargs.get('output_size', 640)),
+            cache_dir
+        )
+    
+    if windows is None:
+        height, width = image.shape[:2]
+        params = {k: v for k, v in kwargs.items() if k in _SCHEDULE_PARAMS}
+        windows, schedule_stats = schedule_windows(SaliencyMap(image), height, width, **params)
+        if stats is not None:
+            stats.update(schedule_stats)
+    
+    # A tile only extracts the windows whose origin it owns
+    if region is not None:
+        x0, y0, x1, y1 = region
+        windows = [w for w in windows if x0 <= w[0] < x1 and y0 <= w[1] < y1]
+    
+    yield from _crop_windows(image, windows, kwargs.get('output_size', 640), pyramid)
 
 
 def process_image(
     image_path: str,
     output_dir: Optional[str] = None,
+    region: Optional[Tuple[int, int, int, int]] = None,
+    tile_index: Optional[int] = None,
     **kwargs
 ) -> List[str]:
     """
     Process a single image with adaptive sliding window.
     
+    Patches are written as they are produced, so only one patch is held in
+    memory at a time when ``output_dir`` is given.
+    
     Args:
         image_path: Path to input image
         output_dir: Directory to save processed patches
-        **kwargs: Additional parameters for adaptive_sliding_window
+        region: Tile region to place windows in (see ``iter_image_patches``)
+        tile_index: Tile number used to keep patch filenames unique
+        **kwargs: Additional parameters for iter_patches
         
     Returns:
         List of paths to saved patches (or patches if no output_dir)
     """
-    # Read image
-    image = cv2.imread(image_path)
-    if image is None:
-        raise ValueError(f"Failed to read image: {image_path}")
-    
-    # Apply adaptive sliding window
-    patches = adaptive_sliding_window(image, **kwargs)
+    stats = {}
+    patch_stream = iter_image_patches(image_path, region=region, stats=stats, **kwargs)
     
     # Save or return patches
     if output_dir:
         os.makedirs(output_dir, exist_ok=True)
         base_name = os.path.splitext(os.path.basename(image_path))[0]
+        if tile_index is not None:
+            base_name = f"{base_name}_tile{tile_index:02d}"
         
-        saved_paths = []
-        for i, patch in enumerate(patches):
+        results = []
+        for i, (_, _, _, patch) in enumerate(patch_stream):
             output_path = os.path.join(output_dir, f"{base_name}_patch_{i:04d}.jpg")
             cv2.imwrite(output_path, patch)
-            saved_paths.append(output_path)
+            results.append(output_path)
+    else:
+        results = [patch for _, _, _, patch in patch_stream]
+    
+    if stats:
+        _print_schedule_stats(stats)
+    if output_dir:
+        print(f"✓ Processed {len(results)} patches from {image_path}")
+    return results
+
+
+def _print_schedule_stats(stats: Dict[str, Any]) -> None:
+    """Report how many windows were scheduled compared with a uniform grid."""
+    print(
+        f"  Scheduled {stats['patches']} windows "
+        f"(uniform grid: {stats['uniform_patches']}, {-stats['saved_ratio']:+.0%} patches)"
+    )
+
+
+def plan_tiles(
+    image_path: str,
+    tile_pixels: int = 64 * 1024 * 1024
+) -> List[Optional[Tuple[int, int, int, int]]]:
+    """
+    Split a large image into bands along its long axis.
+    
+    Args:
+        image_path: Path to input image
+        tile_pixels: Target number of pixels per tile
         
-        print(f"✓ Processed {len(patches)} patches from {image_path}")
-        return saved_paths
+    Returns:
+        List of (x0, y0, x1, y1) tile regions, or [None] for a single tile
+    """
+    width, height = image_size(image_path)
+    n_tiles = -(-(width * height) // tile_pixels)
+    if n_tiles <= 1:
+        return [None]
+    
+    tiles = []
+    if width >= height:
+        step = -(-width // n_tiles)
+        for x0 in range(0, width, step):
+            tiles.append((x0, 0, min(width, x0 + step), height))
     else:
-        return patches
+        step = -(-height // n_tiles)
+        for y0 in range(0, height, step):
+            tiles.append((0, y0, width, min(height, y0 + step)))
+    return tiles
+
+
+def _limit_worker_memory(max_memory_mb: Optional[int]) -> None:
+    """
+    Cap the heap/data memory of a worker process (POSIX only).
+    
+    RLIMIT_DATA is used rather than RLIMIT_AS so read-only memory maps of
+    ``--cache-dir`` arrays, which take address space but little RAM, do not
+    count against the cap.
+    """
+    if not max_memory_mb:
+        return
+    try:
+        import resource
+        limit = int(max_memory_mb) * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_DATA, (limit, limit))
+    except (ImportError, ValueError, OSError) as e:
+        print(f"Warning: could not set worker memory limit: {e}")
+
+
+def saliency_bands(width: int, height: int, n_bands: int) -> List[Tuple[int, int]]:
+    """
+    Split an image into row bands that start on saliency strip boundaries.
+    
+    Args:
+        width: Image width
+        height: Image height
+        n_bands: Target number of bands
+        
+    Returns:
+        List of (y0, y1) row ranges in image order
+    """
+    strip_height = saliency_strip_height(width)
+    n_strips = -(-height // strip_height)
+    step = -(-n_strips // max(1, min(n_bands, n_strips))) * strip_height
+    return [(y0, min(height, y0 + step)) for y0 in range(0, height, step)]
+
+
+def _warm_task(image_path: str, kwargs: Dict[str, Any]) -> Tuple[int, int]:
+    """Decode a tiled image into the memory-mapped cache once, returning (width, height)."""
+    factors = pyramid_factors(kwargs.get('window_sizes', [2560, 1280, 640]), kwargs.get('output_size', 640))
+    warm_cache(image_path, kwargs['cache_dir'], factors)
+    return image_size(image_path)
+
+
+def _saliency_task(image_path: str, cache_dir: str, rows: Tuple[int, int]) -> Tuple[np.ndarray, np.ndarray]:
+    """Compute the saliency cells of one row band of a cached image."""
+    return saliency_cells(open_image(image_path, cache_dir), rows)
+
+
+def _schedule_bands(
+    width: int,
+    height: int,
+    cells: List[Tuple[np.ndarray, np.ndarray]],
+    kwargs: Dict[str, Any]
+) -> Tuple[List[Tuple[int, int, int, float]], Dict[str, Any]]:
+    """Stitch per-band saliency cells and schedule the windows of the whole image."""
+    saliency_map = SaliencyMap.from_cells(
+        np.concatenate([edge for edge, _ in cells]),
+        np.concatenate([lbp for _, lbp in cells])
+    )
+    params = {k: v for k, v in kwargs.items() if k in _SCHEDULE_PARAMS}
+    return schedule_windows(saliency_map, height, width, **params)
+
+
+def _process_task(task: Tuple[str, str, Optional[Tuple[int, int, int, int]], Optional[int], Dict[str, Any]]) -> Tuple[int, Optional[str]]:
+    """Run one image or tile task, returning (patch count, error message)."""
+    image_path, output_dir, region, tile_index, kwargs = task
+    try:
+        patches = process_image(image_path, output_dir, region=region, tile_index=tile_index, **kwargs)
+        return len(patches), None
+    except MemoryError:
+        return 0, "out of memory (raise --max-memory-mb or lower --tile-pixels)"
+    except Exception as e:
+        return 0, str(e)
 
 
 def process_directory(
     input_dir: str,
     output_dir: str,
+    workers: int = 1,
+    max_memory_mb: Optional[int] = None,
+    tile_pixels: int = 64 * 1024 * 1024,
     **kwargs
 ) -> int:
     """
     Process all images in a directory.
     
+    With ``workers > 1`` images are spread across a process pool, and images
+    larger than ``tile_pixels`` are split into tiles whose patches are
+    extracted independently, so one huge painting does not serialize the
+    run. A tiled image is decoded once into the memory-mapped cache (a
+    temporary one unless ``cache_dir`` is given), its saliency is computed
+    in parallel bands and scheduled as a whole, so it yields the same
+    patches as serial processing while no tile decodes the full image.
+    
     Args:
         input_dir: Input directory containing images
         output_dir: Output directory for processed patches
+        workers: Number of worker processes
+        max_memory_mb: Heap memory cap per worker process
+        tile_pixels: Pixel count above which images are tiled (parallel mode)
         **kwargs: Additional parameters for processing
         
     Returns:
@@ -166,21 +657,123 @@ def process_directory(
     total_patches = 0
     
     # Get all image files
-    image_extensions = ('.jpg', '.jpeg', '.png', '.bmp', '.tiff')
-    image_files = [
+    image_extensions = ('.jpg', '.jpeg', '.png', '.webp', '.bmp', '.tif', '.tiff')
+    image_files = sorted(
         f for f in os.listdir(input_dir)
         if f.lower().endswith(image_extensions)
-    ]
+    )
     
     print(f"Found {len(image_files)} images to process")
     
+    if workers <= 1:
+        for image_file in image_files:
+            image_path = os.path.join(input_dir, image_file)
+            try:
+                patches = process_image(image_path, output_dir, **kwargs)
+                total_patches += len(patches)
+            except Exception as e:
+                print(f"✗ Error processing {image_file}: {e}")
+        
+        print(f"\n✓ Processing complete: {total_patches} total patches")
+        return total_patches
+    
+    # Plan tiles for every image
+    images = []
     for image_file in image_files:
         image_path = os.path.join(input_dir, image_file)
         try:
-            patches = process_image(image_path, output_dir, **kwargs)
-            total_patches += len(patches)
+            images.append((image_path, plan_tiles(image_path, tile_pixels)))
         except Exception as e:
             print(f"✗ Error processing {image_file}: {e}")
+    n_tasks = sum(len(tiles) for _, tiles in images)
+    tiled = {image_path: tiles for image_path, tiles in images if tiles[0] is not None}
+    
+    # Tiles and saliency bands read a tiled image from the memory-mapped
+    # decode cache, so it is decoded once rather than once per task
+    tiled_kwargs, temp_cache = kwargs, None
+    if tiled and not kwargs.get('cache_dir'):
+        temp_cache = tempfile.mkdtemp(prefix='vulca_cache_')
+        tiled_kwargs = {**kwargs, 'cache_dir': temp_cache}
+    
+    from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+    
+    print(f"Processing {n_tasks} tasks with {workers} workers")
+    try:
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=_limit_worker_memory,
+            initargs=(max_memory_mb,)
+        ) as executor:
+            # Untiled images start right away; a tiled image is decoded, its
+            # saliency computed band by band, scheduled as a whole, and then
+            # every tile extracts the windows whose origin it owns
+            pending = {}
+            for image_path, tiles in images:
+                if image_path in tiled:
+                    future = executor.submit(_warm_task, image_path, tiled_kwargs)
+                    pending[future] = ('warm', image_path, None)
+                else:
+                    future = executor.submit(_process_task, (image_path, output_dir, None, None, kwargs))
+                    pending[future] = ('process', image_path, None)
+            
+            sizes, band_cells = {}, {}
+            done = 0
+            while pending:
+                finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    stage, image_path, index = pending.pop(future)
+                    label = os.path.basename(image_path)
+                    
+                    if stage == 'process':
+                        if index is not None:
+                            label = f"{label} (tile {index + 1})"
+                        try:
+                            n_patches, error = future.result()
+                        except Exception as e:
+                            # Worker died (e.g. killed by the memory cap)
+                            n_patches, error = 0, str(e)
+                        done += 1
+                        if error:
+                            print(f"✗ [{done}/{n_tasks}] Error processing {label}: {error}")
+                        else:
+                            total_patches += n_patches
+                            print(f"[{done}/{n_tasks}] {label}: {n_patches} patches")
+                        continue
+                    
+                    if image_path not in tiled:
+                        # An earlier stage of this image already failed
+                        continue
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        print(f"✗ Error scheduling {label}: {e}")
+                        n_tasks -= len(tiled.pop(image_path))
+                        continue
+                    
+                    if stage == 'warm':
+                        sizes[image_path] = result
+                        bands = saliency_bands(*result, max(workers, len(tiled[image_path])))
+                        band_cells[image_path] = [None] * len(bands)
+                        for band_index, rows in enumerate(bands):
+                            future = executor.submit(_saliency_task, image_path, tiled_kwargs['cache_dir'], rows)
+                            pending[future] = ('saliency', image_path, band_index)
+                        continue
+                    
+                    cells = band_cells[image_path]
+                    cells[index] = result
+                    if any(c is None for c in cells):
+                        continue
+                    windows, stats = _schedule_bands(*sizes[image_path], cells, kwargs)
+                    del band_cells[image_path]
+                    print(f"{label}:")
+                    _print_schedule_stats(stats)
+                    tile_kwargs = {**tiled_kwargs, 'windows': windows}
+                    for tile_index, region in enumerate(tiled[image_path]):
+                        task = (image_path, output_dir, region, tile_index, tile_kwargs)
+                        pending[executor.submit(_process_task, task)] = ('process', image_path, tile_index)
+    finally:
+        if temp_cache:
+            shutil.rmtree(temp_cache, ignore_errors=True)
     
     print(f"\n✓ Processing complete: {total_patches} total patches")
     return total_patches
@@ -201,27 +794,45 @@ def main():
                        help="Low saliency threshold")
     parser.add_argument("--threshold-high", type=float, default=0.6,
                        help="High saliency threshold")
+    parser.add_argument("--config", help="Config file whose 'preprocessing' block "
+                       "(e.g. stride_factors in configs/best_config.json) overrides the defaults")
+    parser.add_argument("--workers", type=int, default=1,
+                       help="Worker processes for directory input")
+    parser.add_argument("--max-memory-mb", type=int,
+                       help="Heap memory cap per worker process (memory-mapped --cache-dir files are not counted)")
+    parser.add_argument("--tile-pixels", type=int, default=64 * 1024 * 1024,
+                       help="Split images larger than this many pixels into tiles (with --workers); "
+                       "tiled images are read from --cache-dir, or a temporary cache without it")
+    parser.add_argument("--cache-dir",
+                       help="Cache decoded images and pyramids as memory-mapped .npy files")
     
     args = parser.parse_args()
     
+    params = {
+        'window_sizes': args.window_sizes,
+        'output_size': args.output_size,
+        'saliency_threshold_low': args.threshold_low,
+        'saliency_threshold_high': args.threshold_high
+    }
+    if args.cache_dir:
+        params['cache_dir'] = args.cache_dir
+    if args.config:
+        import yaml
+        with open(args.config, 'r', encoding='utf-8') as f:
+            preprocessing = (yaml.safe_load(f) or {}).get('preprocessing', {})
+        params.update({k: v for k, v in preprocessing.items() if k != 'enabled'})
+    
     # Check if input is file or directory
     if os.path.isfile(args.input):
-        process_image(
-            args.input,
-            args.output,
-            window_sizes=args.window_sizes,
-            output_size=args.output_size,
-            saliency_threshold_low=args.threshold_low,
-            saliency_threshold_high=args.threshold_high
-        )
+        process_image(args.input, args.output, **params)
     elif os.path.isdir(args.input):
         process_directory(
             args.input,
             args.output,
-            window_sizes=args.window_sizes,
-            output_size=args.output_size,
-            saliency_threshold_low=args.threshold_low,
-            saliency_threshold_high=args.threshold_high
+            workers=args.workers,
+            max_memory_mb=args.max_memory_mb,
+            tile_pixels=args.tile_pixels,
+            **params
         )
     else:
         print(f"Error: {args.input} is not a valid file or directory")
@@ -0,0 +1,511 @@
+#!/usr/bin/env python
+"""
+VULCA Framework - Retrieval Module
+Vector indexes over benchmark critiques and BM25 knowledge retrieval
+"""
+
+import os
+import re
+import json
+import glob
+import math
+import hashlib
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+
+try:
+    from .cache import hash_file
+except ImportError:  # Executed as a script from src/
+    from cache import hash_file
+
+
+DEFAULT_INDEX_DIR = "outputs/cache/index"
+
+
+class VectorIndex:
+    """
+    Inner-product index over unit-normalized vectors.
+    
+    With ``n_lists`` set, vectors are partitioned by k-means (IVF) and queries
+    only scan the ``n_probe`` closest lists; otherwise every vector is scored
+    with one matrix product (exact flat search).
+    """
+    
+    def __init__(
+        self,
+        vectors: np.ndarray,
+        centroids: Optional[np.ndarray] = None,
+        assignments: Optional[np.ndarray] = None
+    ):
+        """
+        Wrap prebuilt index arrays (use ``build`` or ``load`` to create one).
+        
+        Args:
+            vectors: Indexed vectors, shape (n, dim)
+            centroids: IVF list centroids, shape (n_lists, dim)
+            assignments: IVF list of each vector, shape (n,)
+        """
+        self.vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        self.centroids = centroids
+        self.assignments = assignments
+        self._lists = None
+        if centroids is not None:
+            order = np.argsort(assignments, kind='stable')
+            bounds = np.searchsorted(assignments[order], np.arange(len(centroids) + 1))
+            self._lists = [order[bounds[i]:bounds[i + 1]] for i in range(len(centroids))]
+    
+    def __len__(self) -> int:
+        return len(self.vectors)
+    
+    @property
+    def is_ivf(self) -> bool:
+        """Whether the index is partitioned into inverted lists."""
+        return self.centroids is not None
+    
+    @classmethod
+    def build(
+        cls,
+        vectors: np.ndarray,
+        n_lists: Optional[int] = None,
+        n_iter: int = 20,
+        seed: int = 0
+    ) -> "VectorIndex":
+        """
+        Build an index.
+        
+        Args:
+            vectors: Unit-normalized vectors, shape (n, dim)
+            n_lists: Number of IVF lists (None or too few vectors builds a flat index)
+            n_iter: K-means iterations
+            seed: Random seed for centroid initialization
+        
+        Returns:
+            VectorIndex
+        """
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if not n_lists or len(vectors) < 2 * n_lists:
+            return cls(vectors)
+        
+        # Spherical k-means
+        rng = np.random.default_rng(seed)
+        centroids = vectors[rng.choice(len(vectors), n_lists, replace=False)].copy()
+        for _ in range(n_iter):
+            assignments = np.argmax(vectors @ centroids.T, axis=1)
+            for i in range(n_lists):
+                members = vectors[assignments == i]
+                if len(members):
+                    centroid = members.sum(axis=0)
+                    centroids[i] = centroid / max(np.linalg.norm(centroid), 1e-12)
+        assignments = np.argmax(vectors @ centroids.T, axis=1)
+        return cls(vectors, centroids, assignments)
+    
+    def search(
+        self,
+        queries: np.ndarray,
+        k: int = 10,
+        n_probe: int = 8
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Find the top-k most similar vectors for each query.
+        
+        Args:
+            queries: Unit-normalized queries, shape (q, dim) or (dim,)
+            k: Number of neighbors
+            n_probe: IVF lists scanned per query
+        
+        Returns:
+            tuple: (scores, indices), each shape (q, k); missing slots are -inf / -1
+        """
+        queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+        k = min(k, len(self))
+        scores = np.full((len(queries), k), -np.inf, dtype=np.float32)
+        indices = np.full((len(queries), k), -1, dtype=np.int64)
+        if k == 0:
+            return scores, indices
+        
+        if not self.is_ivf:
+            return self._top_k(queries @ self.vectors.T, k)
+        
+        # Probe the closest lists of each query
+        n_probe = min(n_probe, len(self.centroids))
+        probes = np.argsort(-(queries @ self.centroids.T), axis=1)[:, :n_probe]
+        for row, lists in enumerate(probes):
+            candidates = np.concatenate([self._lists[i] for i in lists])
+            if not len(candidates):
+                continue
+            top_scores, top = self._top_k(self.vectors[candidates] @ queries[row], k)
+            scores[row, :top.shape[1]] = top_scores[0]
+            indices[row, :top.shape[1]] = candidates[top[0]]
+        return scores, indices
+    
+    @staticmethod
+    def _top_k(similarities: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Select the k largest entries per row, sorted descending."""
+        similarities = np.atleast_2d(similarities)
+        k = min(k, similarities.shape[1])
+        top = np.argpartition(-similarities, k - 1, axis=1)[:, :k]
+        top_scores = np.take_along_axis(similarities, top, axis=1)
+        order = np.argsort(-top_scores, axis=1)
+        return np.take_along_axis(top_scores, order, axis=1), np.take_along_axis(top, order, axis=1)
+    
+    def similarity_stats(self, queries: np.ndarray, chunk_size: int = 1024) -> np.ndarray:
+        """
+        Exact max/mean/min/std similarity of each query to all indexed vectors.
+        
+        Args:
+            queries: Unit-normalized queries, shape (q, dim)
+            chunk_size: Queries scored per matrix product
+        
+        Returns:
+            Array of shape (q, 4): max, mean, min, std
+        """
+        return self.scan(queries, 0, chunk_size)[0]
+    
+    def scan(
+        self,
+        queries: np.ndarray,
+        k: int = 10,
+        chunk_size: int = 1024
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Exact similarity statistics and top-k neighbors from one pass over all vectors.
+        
+        Args:
+            queries: Unit-normalized queries, shape (q, dim)
+            k: Number of neighbors
+            chunk_size: Queries scored per matrix product
+        
+        Returns:
+            tuple: (stats of shape (q, 4) with max, mean, min, std; scores; indices)
+        """
+        queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+        k = min(k, len(self))
+        stats = np.empty((len(queries), 4), dtype=np.float64)
+        scores = np.full((len(queries), k), -np.inf, dtype=np.float32)
+        indices = np.full((len(queries), k), -1, dtype=np.int64)
+        for start in range(0, len(queries), chunk_size):
+            sims = queries[start:start + chunk_size] @ self.vectors.T
+            stats[start:start + chunk_size] = np.stack(
+                [sims.max(axis=1), sims.mean(axis=1), sims.min(axis=1), sims.std(axis=1)], axis=1
+            )
+            if k:
+                scores[start:start + chunk_size], indices[start:start + chunk_size] = self._top_k(sims, k)
+        return stats, scores, indices
+    
+    def save(self, path: str) -> None:
+        """Write the index to an ``.npz`` file."""
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        arrays = {'vectors': self.vectors}
+        if self.is_ivf:
+            arrays.update(centroids=self.centroids, assignments=self.assignments)
+        tmp_path = f"{path}.{os.getpid()}.tmp.npz"
+        np.savez(tmp_path, **arrays)
+        os.replace(tmp_path, path)
+    
+    @classmethod
+    def load(cls, path: str) -> "VectorIndex":
+        """Read an index written by ``save``."""
+        with np.load(path) as data:
+            if 'centroids' in data:
+                return cls(data['vectors'], data['centroids'], data['assignments'])
+            return cls(data['vectors'])
+
+
+def load_benchmark_index(
+    benchmark_file: str,
+    analyzer,
+    index_dir: str = DEFAULT_INDEX_DIR,
+    n_lists: Optional[int] = None
+) -> Tuple[Optional[VectorIndex], List[str]]:
+    """
+    Load the persisted index for a benchmark file, building it on first use.
+    
+    Indexes are keyed by the benchmark contents and embedding model, so an
+    edited benchmark or a different model gets a fresh index.
+    
+    Args:
+        benchmark_file: Path to benchmark JSON with a 'critiques' list
+        analyzer: SemanticAnalyzer used to embed the benchmark
+        index_dir: Directory for persisted indexes
+        n_lists: IVF lists for new indexes (None builds a flat index)
+    
+    Returns:
+        tuple: (index or None if the file is missing, benchmark critiques)
+    """
+    if not os.path.exists(benchmark_file):
+        print(f"Warning: Benchmark file not found: {benchmark_file}")
+        return None, []
+    
+    with open(benchmark_file, 'r', encoding='utf-8') as f:
+        critiques = json.load(f).get('critiques', [])
+    
+    key = hashlib.sha256(
+        f"{hash_file(benchmark_file)}|{analyzer.embedding_model}|{n_lists}".encode('utf-8')
+    ).hexdigest()[:16]
+    index_path = os.path.join(index_dir, f"benchmark_{key}.npz")
+    if os.path.exists(index_path):
+        return VectorIndex.load(index_path), critiques
+    
+    index = VectorIndex.build(analyzer.get_embeddings(critiques), n_lists)
+    if len(index):
+        index.save(index_path)
+        print(f"✓ Benchmark index saved to: {index_path}")
+    return index, critiques
+
+
+_WORD_RE = re.compile(r"[a-z0-9]+|[\u3400-\u9fff]+")
+_CJK_RE = re.compile(r"[\u3400-\u9fff]")
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Split bilingual text into BM25 terms.
+    
+    Latin words are lowercased; runs of CJK characters become overlapping
+    character bigrams (single characters for one-character runs).
+    
+    Args:
+        text: Input text
+    
+    Returns:
+        List of terms
+    """
+    terms = []
+    for word in _WORD_RE.findall(text.lower()):
+        if _CJK_RE.match(word):
+            terms.extend(word[i:i + 2] for i in range(max(1, len(word) - 1)))
+        else:
+            terms.append(word)
+    return terms
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough model token count: one per CJK character, one per four other characters."""
+    cjk = len(_CJK_RE.findall(text))
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+class BM25Index:
+    """Okapi BM25 over tokenized documents, with inverted postings in NumPy arrays."""
+    
+    def __init__(self, documents: List[List[str]], k1: float = 1.5, b: float = 0.75):
+        """
+        Build the index.
+        
+        Args:
+            documents: Tokenized documents
+            k1: Term frequency saturation
+            b: Document length normalization
+        """
+        self.n_docs = len(documents)
+        lengths = np.array([len(doc) for doc in documents], dtype=np.float64)
+        avg_length = lengths.mean() if self.n_docs else 0.0
+        norm = k1 * (1 - b + b * lengths / max(avg_length, 1e-9))
+        
+        postings: Dict[str, Tuple[List[int], List[int]]] = {}
+        for doc_id, doc in enumerate(documents):
+            for term, tf in Counter(doc).items():
+                ids, tfs = postings.setdefault(term, ([], []))
+                ids.append(doc_id)
+                tfs.append(tf)
+        
+        # Precompute each posting's BM25 weight; queries only sum them
+        self.postings: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+        for term, (ids, tfs) in postings.items():
+            ids = np.array(ids)
+            tfs = np.array(tfs, dtype=np.float64)
+            idf = math.log(1 + (self.n_docs - len(ids) + 0.5) / (len(ids) + 0.5))
+            self.postings[term] = (ids, idf * tfs * (k1 + 1) / (tfs + norm[ids]))
+    
+    def score(self, query_terms: List[str]) -> np.ndarray:
+        """
+        Score every document against a query.
+        
+        Args:
+            query_terms: Tokenized query (duplicates are ignored)
+        
+        Returns:
+            Array of BM25 scores, one per document
+        """
+        scores = np.zeros(self.n_docs)
+        for term in set(query_terms):
+            if term in self.postings:
+                ids, weights = self.postings[term]
+                scores[ids] += weights
+        return scores
+
+
+class KnowledgeRetriever:
+    """
+    Passage retrieval over the knowledge base for prompt context.
+    
+    Passages come from ``knowledge_base.json`` (one per topic aspect) and
+    from the critic notes under ``knowledge-base/critics`` (one per markdown
+    section). Shared knowledge is searched for every request; a critic's
+    own notes are only searched for that critic's persona. Scores are BM25,
+    optionally blended with embedding similarity.
+    """
+    
+    def __init__(
+        self,
+        passages: List[Dict[str, Any]],
+        top_k: int = 5,
+        token_budget: int = 600,
+        analyzer=None,
+        embedding_weight: float = 0.5
+    ):
+        """
+        Index passages.
+        
+        Args:
+            passages: Dicts with 'text', 'source' and 'critic' (None for shared knowledge)
+            top_k: Default maximum passages per request
+            token_budget: Default maximum estimated context tokens per request
+            analyzer: Optional SemanticAnalyzer for hybrid BM25 + embedding scoring
+            embedding_weight: Weight of embedding similarity in hybrid scores
+        """
+        self.passages = passages
+        self.top_k = top_k
+        self.token_budget = token_budget
+        self.bm25 = BM25Index([tokenize(p['text']) for p in passages])
+        self.critics = sorted({p['critic'] for p in passages if p['critic']})
+        self._critic_ids = np.array([p['critic'] or '' for p in passages])
+        self.analyzer = analyzer
+        self.embedding_weight = embedding_weight
+        self._embeddings = analyzer.get_embeddings([p['text'] for p in passages]) if analyzer else None
+    
+    @classmethod
+    def from_sources(
+        cls,
+        knowledge_file: str = "data/knowledge/knowledge_base.json",
+        critics_dir: str = "knowledge-base/critics",
+        max_passage_chars: int = 1200,
+        **kwargs
+    ) -> "KnowledgeRetriever":
+        """
+        Build a retriever from the repository's knowledge files.
+        
+        Args:
+            knowledge_file: Topic-keyed knowledge base JSON
+            critics_dir: Directory of per-critic markdown notes
+            max_passage_chars: Split longer markdown sections at paragraph breaks
+            **kwargs: Constructor options (top_k, token_budget, analyzer, embedding_weight)
+        
+        Returns:
+            KnowledgeRetriever
+        """
+        passages = []
+        if os.path.exists(knowledge_file):
+            with open(knowledge_file, 'r', encoding='utf-8') as f:
+                knowledge = json.load(f)
+            for topic, entries in knowledge.items():
+                for entry in entries if isinstance(entries, list) else [entries]:
+                    if isinstance(entry, dict) and entry.get('description'):
+                        title = f"{topic.replace('_', ' ')} ({entry.get('aspect', '').replace('_', ' ')})"
+                        passages.append({
+                            'text': f"{title}: {entry['description']}",
+                            'source': knowledge_file,
+                            'critic': None
+                        })
+        
+        for path in sorted(glob.glob(os.path.join(critics_dir, '*', '*.md'))):
+            critic = os.path.basename(os.path.dirname(path))
+            with open(path, 'r', encoding='utf-8') as f:
+                text = f.read()
+            for section in _split_markdown(text, max_passage_chars):
+                passages.append({'text': section, 'source': path, 'critic': critic})
+        
+        return cls(passages, **kwargs)
+    
+    def critic_for_persona(self, persona: Optional[str]) -> Optional[str]:
+        """
+        Match a persona name (e.g. '郭熙_Guo_Xi') to a critic directory (e.g. 'guo-xi').
+        
+        A critic matches when all words of its directory name occur in the persona name.
+        """
+        if not persona:
+            return None
+        persona_words = set(re.findall(r"[a-z0-9]+", persona.lower()))
+        for critic in self.critics:
+            if set(critic.split('-')) <= persona_words:
+                return critic
+        return None
+    
+    def retrieve(
+        self,
+        query: str,
+        persona: Optional[str] = None,
+        top_k: Optional[int] = None,
+        token_budget: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Select the most relevant passages for a request.
+        
+        Args:
+            query: Query text (persona description, painting details, ...)
+            persona: Persona name, used to include the matching critic's notes
+            top_k: Maximum number of passages (defaults to the retriever's)
+            token_budget: Maximum estimated tokens of all selected passages
+                (defaults to the retriever's)
+        
+        Returns:
+            Selected passages with their 'score', best first
+        """
+        if not self.passages:
+            return []
+        top_k = self.top_k if top_k is None else top_k
+        token_budget = self.token_budget if token_budget is None else token_budget
+        scores = self.bm25.score(tokenize(query))
+        if self._embeddings is not None and scores.max() > 0:
+            similarity = self._embeddings @ self.analyzer.get_embedding(query)
+            scores = (1 - self.embedding_weight) * scores / scores.max() + self.embedding_weight * similarity
+        
+        allowed = self._critic_ids == ''
+        critic = self.critic_for_persona(persona)
+        if critic:
+            allowed |= self._critic_ids == critic
+        scores = np.where(allowed, scores, -np.inf)
+        
+        selected = []
+        used = 0
+        for i in np.argsort(-scores):
+            if len(selected) >= top_k or not np.isfinite(scores[i]) or scores[i] <= 0:
+                break
+            tokens = estimate_tokens(self.passages[i]['text'])
+            if used + tokens > token_budget:
+                continue
+            selected.append({**self.passages[i], 'score': float(scores[i])})
+            used += tokens
+        return selected
+    
+    def build_context(
+        self,
+        query: str,
+        persona: Optional[str] = None,
+        top_k: Optional[int] = None,
+        token_budget: Optional[int] = None
+    ) -> str:
+        """Retrieve passages and join them into a prompt context block."""
+        return "\n\n".join(p['text'] for p in self.retrieve(query, persona, top_k, token_budget))
+
+
+def _split_markdown(text: str, max_chars: int, min_chars: int = 80) -> List[str]:
+    """Split markdown into heading sections, breaking long sections at blank lines."""
+    # Drop YAML front matter
+    text = re.sub(r"\A---\n.*?\n---\n", "", text, flags=re.DOTALL)
+    
+    sections = []
+    for section in re.split(r"\n(?=#{1,4} )", text):
+        section = section.strip()
+        chunk = ""
+        for paragraph in re.split(r"\n\s*\n", section):
+            if chunk and len(chunk) + len(paragraph) > max_chars:
+                sections.append(chunk)
+                chunk = ""
+            chunk = f"{chunk}\n\n{paragraph}" if chunk else paragraph
+        if chunk:
+            sections.append(chunk)
+    
+    # Headings and placeholders alone carry no knowledge
+    return [s for s in sections if len(re.sub(r"^#.*$", "", s, flags=re.MULTILINE).strip()) >= min_chars]
@@ -0,0 +1,197 @@
+#!/usr/bin/env python
+"""
+VULCA Framework - Tiled Image Access Module
+Memory-mapped access to very large paintings and their downscaled pyramids
+"""
+
+import os
+import hashlib
+import threading
+from typing import Dict, List, Optional, Tuple
+import cv2
+import numpy as np
+
+_pil_limit_lock = threading.Lock()
+
+
+def open_pil_image(image_path: str):
+    """
+    Open an image with PIL, allowing sizes above its decompression-bomb limit.
+    
+    Only the header is read here; pixels are decoded when the image is used.
+    Gigapixel scans are expected, but the limit is global, so it is lifted
+    just for the open and restored for other callers.
+    
+    Args:
+        image_path: Path to the image
+    
+    Returns:
+        Lazily loaded ``PIL.Image.Image``
+    """
+    from PIL import Image
+    
+    with _pil_limit_lock:
+        max_pixels = Image.MAX_IMAGE_PIXELS
+        Image.MAX_IMAGE_PIXELS = None
+        try:
+            return Image.open(image_path)
+        finally:
+            Image.MAX_IMAGE_PIXELS = max_pixels
+
+
+def image_size(image_path: str) -> Tuple[int, int]:
+    """
+    Read image dimensions from the file header without decoding pixels.
+    
+    Args:
+        image_path: Path to the image
+    
+    Returns:
+        tuple: (width, height)
+    """
+    with open_pil_image(image_path) as img:
+        return img.size
+
+
+def pyramid_factors(window_sizes: List[int], output_size: int) -> List[int]:
+    """
+    Downscale factors needed so each window scale can be read near output size.
+    
+    Args:
+        window_sizes: Sliding window sizes
+        output_size: Output patch size
+    
+    Returns:
+        Sorted power-of-two factors greater than 1
+    """
+    factors = set()
+    for window_size in window_sizes:
+        factor = 1
+        while factor * 2 <= window_size / output_size:
+            factor *= 2
+        if factor > 1:
+            factors.add(factor)
+    return sorted(factors)
+
+
+def _cache_stem(image_path: str, cache_dir: str) -> str:
+    """Cache file prefix tied to the source file's identity and modification time."""
+    stat = os.stat(image_path)
+    key = f"{os.path.abspath(image_path)}|{stat.st_mtime}|{stat.st_size}"
+    digest = hashlib.sha1(key.encode('utf-8')).hexdigest()[:16]
+    base_name = os.path.splitext(os.path.basename(image_path))[0]
+    return os.path.join(cache_dir, f"{base_name}_{digest}")
+
+
+def _save_npy(path: str, array: np.ndarray, strip_height: int = 1024) -> None:
+    """Write an array to a .npy file in row strips, atomically replacing any existing file."""
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    out = np.lib.format.open_memmap(tmp_path, mode='w+', dtype=array.dtype, shape=array.shape)
+    for y in range(0, array.shape[0], strip_height):
+        out[y:y + strip_height] = array[y:y + strip_height]
+    out.flush()
+    del out
+    os.replace(tmp_path, path)
+
+
+def _decode(image_path: str) -> np.ndarray:
+    """
+    Decode an image to a BGR array.
+    
+    Uncompressed TIFFs are memory-mapped in place when ``tifffile`` is
+    installed, so only the regions that are sliced get read from disk.
+    """
+    if image_path.lower().endswith(('.tif', '.tiff')):
+        try:
+            import tifffile
+            rgb = tifffile.memmap(image_path, mode='r')
+            if rgb.ndim == 3 and rgb.shape[2] >= 3 and rgb.dtype == np.uint8:
+                return rgb[..., 2::-1]
+        except (ImportError, ValueError):
+            # tifffile missing, or the TIFF is compressed/tiled: decode fully
+            pass
+    
+    image = cv2.imread(image_path, cv2.IMREAD_COLOR)
+    if image is None:
+        raise ValueError(f"Failed to read image: {image_path}")
+    return image
+
+
+def open_image(image_path: str, cache_dir: Optional[str] = None) -> np.ndarray:
+    """
+    Open a full-resolution BGR image, memory-mapped from the decode cache if possible.
+    
+    With ``cache_dir`` the first call decodes the image once and stores it as
+    a ``.npy`` file; later calls (and other processes) memory-map it, so
+    slicing a window or strip only touches the pages it covers.
+    
+    Args:
+        image_path: Path to the image
+        cache_dir: Directory for decoded ``.npy`` caches
+    
+    Returns:
+        Image array (np.memmap when cached)
+    """
+    if not cache_dir:
+        return _decode(image_path)
+    
+    cache_path = f"{_cache_stem(image_path, cache_dir)}_x1.npy"
+    if not os.path.exists(cache_path):
+        _save_npy(cache_path, _decode(image_path))
+    return np.load(cache_path, mmap_mode='r')
+
+
+def open_pyramid(
+    image_path: str,
+    image: np.ndarray,
+    factors: List[int],
+    cache_dir: Optional[str] = None,
+    strip_height: int = 1024
+) -> Dict[int, np.ndarray]:
+    """
+    Build (or memory-map) area-downscaled copies of an image.
+    
+    Args:
+        image_path: Path to the source image (identifies the cache entries)
+        image: Full-resolution image
+        factors: Power-of-two downscale factors
+        cache_dir: Directory for ``.npy`` caches (None keeps levels in memory)
+        strip_height: Rows of the source level resized at a time
+    
+    Returns:
+        Mapping from factor to downscaled image (factor 1 is the input)
+    """
+    levels = {1: image}
+    source, source_factor = image, 1
+    for factor in sorted(factors):
+        cache_path = None
+        if cache_dir:
+            cache_path = f"{_cache_stem(image_path, cache_dir)}_x{factor}.npy"
+            if os.path.exists(cache_path):
+                levels[factor] = np.load(cache_path, mmap_mode='r')
+                source, source_factor = levels[factor], factor
+                continue
+        
+        # Resize the nearest finer level in strips to bound memory
+        ratio = factor // source_factor
+        height, width = source.shape[0] // ratio, source.shape[1] // ratio
+        level = np.empty((height, width) + source.shape[2:], dtype=source.dtype)
+        step = max(ratio, strip_height // ratio * ratio)
+        for y in range(0, height * ratio, step):
+            strip = np.ascontiguousarray(source[y:min(y + step, height * ratio), :width * ratio])
+            level[y // ratio:(y + strip.shape[0]) // ratio] = cv2.resize(
+                strip, (width, strip.shape[0] // ratio), interpolation=cv2.INTER_AREA
+            )
+        
+        if cache_path:
+            _save_npy(cache_path, level)
+            level = np.load(cache_path, mmap_mode='r')
+        levels[factor] = level
+        source, source_factor = level, factor
+    return levels
+
+
+def warm_cache(image_path: str, cache_dir: str, factors: List[int]) -> None:
+    """Decode an image and build its pyramid cache without extracting patches."""
+    open_pyramid(image_path, open_image(image_path, cache_dir), factors, cache_dir)
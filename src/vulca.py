@@ -6,11 +6,23 @@ Vision-Understanding and Language-based Cultural Adaptability Framework
 
 import os
 import json
+import threading
+import cv2
+import numpy as np
 import yaml
-from typing import Dict, Optional, List, Any
-from .evaluate import generate_critique
-from .preprocess import process_image
-from .analyze import analyze_critiques
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Optional, List, Any, Union
+from .evaluate import (
+    _downscale_image, build_critique_prompt, generate_critique,
+    payload_cache, save_critique
+)
+from .model import MLLMInterface, RetryPolicy, build_chat_payload, get_client, set_rate_limit
+from .cache import CritiqueCache
+from .journal import JobJournal
+from .generation import AdaptiveTokenBudget, GenerationParams
+from .retrieval import KnowledgeRetriever
+from .preprocess import iter_image_patches
+from .analyze import analyze_critiques, save_analysis, warmup_embedding_model, DEFAULT_EMBEDDING_STORE
 
 
 class VULCA:
@@ -19,43 +31,165 @@ class VULCA:
     Provides a simple API for painting evaluation using MLLMs with cultural personas.
     """
     
-    def __init__(self, config_path: str = "configs/default.yaml"):
+    def __init__(self, config_path: str = "configs/default.yaml", use_cache: Optional[bool] = None):
         """
         Initialize VULCA framework with configuration.
         
         Args:
             config_path: Path to configuration file
+            use_cache: Enable the critique cache (None defers to ``cache.enabled`` in config)
         """
         self.config = self._load_config(config_path)
+        self.generation = GenerationParams.from_config(self.config['model'])
+        self.token_budget = self._build_token_budget()
         self.personas = self._load_personas()
         self.knowledge_base = self._load_knowledge_base()
-        
+        self.retriever = self._build_retriever()
+        self._configure_rate_limits()
+        self._configure_client()
+        self.retry_policy = RetryPolicy(**(self.config.get('retry') or {}))
+        self.cache = self._open_cache(use_cache)
+        self._patches: Dict[tuple, str] = {}
+        self._patch_locks: Dict[tuple, threading.Lock] = {}
+        self._patch_registry_lock = threading.Lock()
+        payload_cache.max_bytes = int((self.config.get('cache') or {}).get('payload_mb', 256) * 1024 * 1024)
+    
     def _load_config(self, config_path: str) -> Dict:
         """Load configuration from YAML file."""
         if os.path.exists(config_path):
             with open(config_path, 'r', encoding='utf-8') as f:
-                return yaml.safe_load(f)
+                config = yaml.safe_load(f) or {}
+            if 'model' not in config and 'models' in config:
+                # configs/model_config.yaml layout: pick the default model
+                model_key = config.get('default_model') or next(iter(config['models']))
+                config['model'] = dict(config['models'][model_key])
+            return config
         else:
             # Default configuration
             return {
                 'model': {
                     'name': 'Qwen/Qwen2.5-VL-7B-Instruct',
                     'api_endpoint': 'http://localhost:8000/v1/chat/completions',
-                    'max_tokens': 2048,
-                    'temperature': 0.7
+                    'api_endpoints': None,  # Replica URLs to load-balance across
+                    'max_tokens': 2048,  # Alias: max_new_tokens
+                    'temperature': 0.7,
+                    'top_p': None,
+                    'max_image_pixels': None,  # e.g. 1003520 (1280 * 28 * 28) for Qwen2.5-VL
+                    'prompt_layout': 'persona_first',  # 'prefix_cache': image + shared instructions first
+                    'stream': False,  # SSE streaming with TTFT / decode-speed metrics
+                    'idle_timeout': 30  # Streaming: seconds without new tokens before failing
                 },
                 'preprocessing': {
                     'window_sizes': [2560, 1280, 640],
                     'output_size': 640,
                     'saliency_threshold_low': 0.25,
-                    'saliency_threshold_high': 0.6
+                    'saliency_threshold_high': 0.6,
+                    'stride_factors': {'low': 0.9, 'medium': 0.75, 'high': 0.5}
                 },
                 'analysis': {
                     'embedding_model': 'BAAI/bge-large-zh-v1.5',
-                    'embedding_dim': 1024
+                    'embedding_dim': 1024,
+                    'embedding_store': 'outputs/cache/embeddings.sqlite',
+                    'warmup': True,
+                    'incremental': False,
+                    'pipelined': False,
+                    'pipeline_queue': 256
+                },
+                'knowledge': {
+                    'retrieval': True,
+                    'critics_dir': 'knowledge-base/critics',
+                    'top_k': 5,
+                    'token_budget': 600
+                },
+                'token_budget': {
+                    'adaptive': False,  # Cap max_tokens per persona from observed critique lengths
+                    'target_chars': [300, 500],
+                    'headroom': 1.5,
+                    'min_samples': 5,
+                    'min_tokens': 256
+                },
+                'concurrency': {
+                    'max_in_flight': 1,
+                    'rate_limits': {}
+                },
+                'http': {
+                    'pool_connections': 4,
+                    'pool_maxsize': 16,
+                    'compress': False
+                },
+                'retry': {
+                    'max_retries': 3,
+                    'backoff_base': 1.0,
+                    'backoff_max': 30,
+                    'budget_ratio': 0.2,
+                    'budget_min': 10,
+                    'hedge_quantile': None  # e.g. 0.95 to hedge requests slower than p95
+                },
+                'load_balancing': {
+                    'strategy': 'least_outstanding',
+                    'eject_after': 3,
+                    'cooldown': 30
+                },
+                'cache': {
+                    'enabled': False,
+                    'path': 'outputs/cache/critiques.sqlite',
+                    'max_size_mb': 512,
+                    'max_age_days': None,
+                    'payload_mb': 256
                 }
             }
     
+    def _configure_rate_limits(self, rate_limits: Optional[Dict[str, float]] = None) -> None:
+        """Register per-endpoint rate limits (``concurrency.rate_limits`` in config by default)."""
+        if rate_limits is None:
+            rate_limits = self.config.get('concurrency', {}).get('rate_limits') or {}
+        for endpoint, rate in rate_limits.items():
+            set_rate_limit(endpoint, rate)
+    
+    def limit_request_rate(self, rate: Optional[float]) -> None:
+        """Limit every configured endpoint to ``rate`` requests per second (None removes the limit)."""
+        endpoints = self.api_endpoint
+        for endpoint in [endpoints] if isinstance(endpoints, str) else endpoints:
+            set_rate_limit(endpoint, rate)
+    
+    @property
+    def api_endpoint(self) -> Union[str, List[str]]:
+        """Configured endpoint URL, or the replica list when ``api_endpoints`` is set."""
+        return self.config['model'].get('api_endpoints') or self.config['model']['api_endpoint']
+    
+    def _configure_client(self) -> None:
+        """Create the shared pooled API client with configured HTTP options."""
+        http_options = dict(self.config.get('http') or {})
+        max_in_flight = self.config.get('concurrency', {}).get('max_in_flight', 1)
+        http_options['pool_maxsize'] = max(http_options.get('pool_maxsize', 16), max_in_flight)
+        if not isinstance(self.api_endpoint, str):
+            http_options.update(self.config.get('load_balancing') or {})
+        get_client(
+            self.config['model']['name'],
+            self.api_endpoint,
+            **http_options
+        )
+    
+    def _build_token_budget(self) -> Optional[AdaptiveTokenBudget]:
+        """Create the adaptive per-persona token budget if enabled in configuration."""
+        budget_config = dict(self.config.get('token_budget') or {})
+        if not budget_config.pop('adaptive', False):
+            return None
+        return AdaptiveTokenBudget(**budget_config)
+    
+    def _open_cache(self, use_cache: Optional[bool]) -> Optional[CritiqueCache]:
+        """Open the critique cache if enabled by argument or configuration."""
+        cache_config = self.config.get('cache') or {}
+        if use_cache is None:
+            use_cache = cache_config.get('enabled', False)
+        if not use_cache:
+            return None
+        return CritiqueCache(
+            path=cache_config.get('path', 'outputs/cache/critiques.sqlite'),
+            max_size_mb=cache_config.get('max_size_mb'),
+            max_age_days=cache_config.get('max_age_days')
+        )
+    
     def _load_personas(self) -> Dict[str, str]:
         """Load persona definitions from markdown files."""
         personas = {}
@@ -78,6 +212,110 @@ class VULCA:
                 return json.load(f)
         return {}
     
+    def _build_retriever(self) -> Optional[KnowledgeRetriever]:
+        """Index the knowledge base and critic notes for per-request retrieval."""
+        knowledge_config = self.config.get('knowledge') or {}
+        if not knowledge_config.get('retrieval', True):
+            return None
+        retriever = KnowledgeRetriever.from_sources(
+            knowledge_file="data/knowledge/knowledge_base.json",
+            critics_dir=knowledge_config.get('critics_dir', 'knowledge-base/critics'),
+            top_k=knowledge_config.get('top_k', 5),
+            token_budget=knowledge_config.get('token_budget', 600)
+        )
+        return retriever if retriever.passages else None
+    
+    def _prepare_image(self, image_path: str, output_dir: str) -> str:
+        """
+        Return the image to send to the model, extracting the first patch if preprocessing is enabled.
+        
+        The patch is extracted once per painting (and file version), so
+        concurrent persona jobs share one file instead of rewriting it while
+        others are reading it.
+        
+        Args:
+            image_path: Path to the painting image
+            output_dir: Directory whose ``patches`` subdirectory receives the patch
+        
+        Returns:
+            Path of the image to evaluate
+        """
+        if not self.config.get('preprocessing', {}).get('enabled', False):
+            return image_path
+        
+        preprocessing = {
+            k: v for k, v in self.config['preprocessing'].items()
+            if k != 'enabled'
+        }
+        stat = os.stat(image_path)
+        key = (os.path.abspath(image_path), stat.st_mtime, stat.st_size, os.path.abspath(output_dir))
+        with self._patch_registry_lock:
+            lock = self._patch_locks.setdefault(key, threading.Lock())
+        with lock:
+            if key in self._patches:
+                return self._patches[key]
+            eval_image = self._extract_patch(image_path, output_dir, preprocessing)
+            self._patches[key] = eval_image
+            return eval_image
+    
+    @staticmethod
+    def _extract_patch(image_path: str, output_dir: str, preprocessing: Dict[str, Any]) -> str:
+        """Write the first patch of a painting atomically and return its path."""
+        # Use first slice for evaluation (simplified); the patch
+        # stream is consumed lazily so only that slice is extracted
+        first_patch = next(iter_image_patches(image_path, **preprocessing), None)
+        if first_patch is None:
+            return image_path
+        patch_dir = os.path.join(output_dir, "patches")
+        os.makedirs(patch_dir, exist_ok=True)
+        base_name = os.path.splitext(os.path.basename(image_path))[0]
+        eval_image = os.path.join(patch_dir, f"{base_name}_patch_0000.jpg")
+        # Readers never see a partly written JPEG
+        tmp_path = f"{eval_image}.{os.getpid()}.{threading.get_ident()}.tmp.jpg"
+        cv2.imwrite(tmp_path, first_patch[3])
+        os.replace(tmp_path, eval_image)
+        return eval_image
+    
+    def _finish_evaluation(self, results: Dict[str, Any], output_dir: str) -> Dict[str, Any]:
+        """
+        Analyze a generated critique (if enabled) and save the evaluation record.
+        
+        Args:
+            results: Evaluation record with its critique
+            output_dir: Directory to save the record
+        
+        Returns:
+            Saved (JSON-serializable) evaluation record
+        """
+        if self.config.get('analysis', {}).get('enabled', False):
+            results['analysis'] = analyze_critiques(
+                [results['critique']],
+                embedding_model=self.config['analysis']['embedding_model'],
+                store_path=self.config['analysis'].get('embedding_store', DEFAULT_EMBEDDING_STORE)
+            )
+        
+        # Save results
+        from datetime import datetime
+        results['timestamp'] = datetime.now().isoformat()
+        
+        output_path = os.path.join(
+            output_dir,
+            f"evaluation_{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}.json"
+        )
+        # Embeddings go to sidecar .npy files; keep the slim summary
+        results = save_analysis(results, output_path)
+        
+        print(f"✓ Evaluation complete. Results saved to: {output_path}")
+        return results
+    
+    @staticmethod
+    def _list_images(image_dir: str) -> List[str]:
+        """Sorted painting file names in a directory."""
+        return sorted(
+            f for f in os.listdir(image_dir)
+            if f.lower().endswith(('.jpg', '.jpeg', '.png', '.webp'))
+        )
+    
     def evaluate_painting(
         self,
         image_path: str,
@@ -91,7 +329,7 @@ class VULCA:
             image_path: Path to the painting image
             persona: Name of cultural persona to use (optional)
             output_dir: Directory to save outputs
-            
+        
         Returns:
             Dictionary containing critique and analysis results
         """
@@ -106,54 +344,46 @@ class VULCA:
         
         try:
             # Step 1: Preprocess image if needed
-            if self.config.get('preprocessing', {}).get('enabled', False):
-                processed_images = process_image(
-                    image_path,
-                    **self.config['preprocessing']
-                )
-                # Use first slice for evaluation (simplified)
-                eval_image = processed_images[0] if processed_images else image_path
-            else:
-                eval_image = image_path
+            eval_image = self._prepare_image(image_path, output_dir)
             
             # Step 2: Generate critique
             persona_text = self.personas.get(persona, "") if persona else ""
+            model_params = self.generation.to_request()
+            if self.token_budget is not None:
+                budget = self.token_budget.budget(persona, self.generation.max_tokens)
+                if budget:
+                    model_params['max_tokens'] = budget
+            usage = {}
             critique = generate_critique(
                 image_path=eval_image,
                 model_name=self.config['model']['name'],
                 persona_text=persona_text,
                 knowledge_base=self.knowledge_base,
-                api_endpoint=self.config['model']['api_endpoint'],
-                model_params={
-                    'max_tokens': self.config['model']['max_tokens'],
-                    'temperature': self.config['model']['temperature']
-                },
-                output_dir=output_dir
+                api_endpoint=self.api_endpoint,
+                model_params=model_params,
+                output_dir=output_dir,
+                cache=self.cache,
+                max_image_pixels=self.config['model'].get('max_image_pixels'),
+                retry_policy=self.retry_policy,
+                retriever=self.retriever,
+                persona_name=persona,
+                prompt_layout=self.config['model'].get('prompt_layout', 'persona_first'),
+                metrics=usage,
+                stream=self.config['model'].get('stream', False),
+                idle_timeout=self.config['model'].get('idle_timeout', 30)
             )
             results['critique'] = critique
+            if self.token_budget is not None:
+                self.token_budget.record(persona, critique, usage.get('completion_tokens'))
+            timing = usage.pop('timing', None)
+            if usage:
+                results['usage'] = usage
+            if timing:
+                results['timing'] = timing
             
-            # Step 3: Analyze critique (optional)
-            if self.config.get('analysis', {}).get('enabled', False):
-                analysis = analyze_critiques(
-                    [critique],
-                    embedding_model=self.config['analysis']['embedding_model']
-                )
-                results['analysis'] = analysis
-            
-            # Save results
-            from datetime import datetime
-            results['timestamp'] = datetime.now().isoformat()
-            
-            output_path = os.path.join(
-                output_dir,
-                f"evaluation_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
-            )
-            os.makedirs(output_dir, exist_ok=True)
-            with open(output_path, 'w', encoding='utf-8') as f:
-                json.dump(results, f, ensure_ascii=False, indent=2)
-            
-            print(f"✓ Evaluation complete. Results saved to: {output_path}")
-            
+            # Step 3: Analyze critique (optional) and save results
+            results = self._finish_evaluation(results, output_dir)
+        
         except Exception as e:
             results['error'] = str(e)
             print(f"✗ Evaluation failed: {e}")
@@ -164,54 +394,366 @@ class VULCA:
         self,
         image_dir: str,
         personas: Optional[List[str]] = None,
-        output_dir: str = "outputs/batch"
+        output_dir: str = "outputs/batch",
+        max_in_flight: Optional[int] = None,
+        resume: bool = False,
+        on_result: Optional[Callable[[Dict[str, Any]], None]] = None
     ) -> List[Dict[str, Any]]:
         """
         Evaluate multiple paintings with optional multiple personas.
         
+        Evaluations run on a thread pool bounded by ``max_in_flight``; results
+        are returned in image × persona order regardless of completion order.
+        Every job is recorded in ``journal.jsonl`` under ``output_dir`` so an
+        interrupted run can be continued with ``resume=True``.
+        
         Args:
             image_dir: Directory containing painting images
             personas: List of personas to use (None for baseline)
             output_dir: Directory to save outputs
-            
+            max_in_flight: Maximum concurrent MLLM requests
+                (defaults to ``concurrency.max_in_flight`` in config, 1 = serial)
+            resume: Skip jobs completed in a previous run and retry the rest
+            on_result: Called with each result as soon as its job finishes
+                (from worker threads when max_in_flight > 1)
+        
         Returns:
             List of evaluation results
         """
-        results = []
+        if max_in_flight is None:
+            max_in_flight = self.config.get('concurrency', {}).get('max_in_flight', 1)
+        max_in_flight = max(1, int(max_in_flight))
         
         # Get all image files
-        image_files = [
-            f for f in os.listdir(image_dir)
-            if f.lower().endswith(('.jpg', '.jpeg', '.png', '.webp'))
-        ]
+        image_files = self._list_images(image_dir)
         
         # If no personas specified, use baseline (None)
         if personas is None:
             personas = [None]
         
-        # Process each image with each persona
-        for image_file in image_files:
+        jobs = [
+            (image_file, persona)
+            for image_file in image_files
+            for persona in personas
+        ]
+        
+        model_name = self.config['model']['name']
+        journal = JobJournal(os.path.join(output_dir, "journal.jsonl"), resume=resume)
+        if resume:
+            done = sum(
+                journal.status(
+                    JobJournal.job_id(os.path.join(image_dir, image_file), persona, model_name)
+                ) == JobJournal.DONE
+                for image_file, persona in jobs
+            )
+            print(f"Resuming: {done}/{len(jobs)} jobs already complete")
+        
+        # With a prefix-cache prompt layout, the first persona of each painting
+        # runs alone so the others can reuse its cached image prefill. Jobs are
+        # dispatched in order, so the first job is running before its followers wait.
+        prefix_warm = None
+        if self.config['model'].get('prompt_layout') == 'prefix_cache' and len(personas) > 1:
+            prefix_warm = {image_file: threading.Event() for image_file in image_files}
+        
+        def evaluate_job(image_file, persona):
+            job_id = JobJournal.job_id(os.path.join(image_dir, image_file), persona, model_name)
+            previous = journal.result(job_id)
+            if previous is not None:
+                if on_result:
+                    on_result(previous)
+                return previous
+            
+            if prefix_warm and persona != personas[0]:
+                prefix_warm[image_file].wait()
+            
+            job_info = {'image_file': image_file, 'persona': persona, 'model': model_name}
+            journal.record(job_id, JobJournal.RUNNING, **job_info)
+            print(f"\nEvaluating: {image_file} with persona: {persona or 'baseline'}")
             image_path = os.path.join(image_dir, image_file)
-            for persona in personas:
-                print(f"\nEvaluating: {image_file} with persona: {persona or 'baseline'}")
-                result = self.evaluate_painting(image_path, persona, output_dir)
-                result['image_file'] = image_file
-                results.append(result)
+            result = self.evaluate_painting(image_path, persona, output_dir)
+            result['image_file'] = image_file
+            if result.get('error'):
+                journal.record(job_id, JobJournal.FAILED, error=result['error'], **job_info)
+            else:
+                journal.record(job_id, JobJournal.DONE, result=result, **job_info)
+            if on_result:
+                on_result(result)
+            return result
+        
+        def run_job(job):
+            image_file, persona = job
+            try:
+                return evaluate_job(image_file, persona)
+            finally:
+                # Release the painting's other personas however the first one ends
+                if prefix_warm and persona == personas[0]:
+                    prefix_warm[image_file].set()
+        
+        # Process each image with each persona
+        if max_in_flight == 1:
+            results = [run_job(job) for job in jobs]
+        else:
+            print(f"Running {len(jobs)} evaluations with up to {max_in_flight} in flight")
+            with ThreadPoolExecutor(max_workers=max_in_flight) as executor:
+                results = list(executor.map(run_job, jobs))
         
         # Save batch summary
+        os.makedirs(output_dir, exist_ok=True)
         summary_path = os.path.join(output_dir, "batch_summary.json")
         with open(summary_path, 'w', encoding='utf-8') as f:
             json.dump(results, f, ensure_ascii=False, indent=2)
         
         print(f"\n✓ Batch evaluation complete. {len(results)} evaluations saved.")
+        failed = journal.summary().get(JobJournal.FAILED, 0)
+        if failed:
+            print(f"  {failed} evaluations failed; rerun with --resume to retry them")
+        prompt_tokens = sum((r.get('usage') or {}).get('prompt_tokens') or 0 for r in results)
+        cached_tokens = sum((r.get('usage') or {}).get('cached_tokens') or 0 for r in results)
+        if prompt_tokens:
+            print(f"  Prefix cache reuse: {cached_tokens}/{prompt_tokens} prompt tokens "
+                  f"({cached_tokens / prompt_tokens:.0%})")
+        ttfts = [r['timing']['ttft'] for r in results if (r.get('timing') or {}).get('ttft') is not None]
+        if ttfts:
+            speeds = [r['timing']['tokens_per_second'] for r in results
+                      if (r.get('timing') or {}).get('tokens_per_second')]
+            print(f"  Streaming: median TTFT {np.median(ttfts):.2f}s, p95 TTFT {np.percentile(ttfts, 95):.2f}s"
+                  + (f", median decode {np.median(speeds):.1f} tokens/s" if speeds else ""))
+        if self.token_budget is not None:
+            budgets = ", ".join(
+                f"{persona or 'baseline'}: {self.token_budget.budget(persona, self.generation.max_tokens)}"
+                for persona in personas
+            )
+            print(f"  Adaptive max_tokens per persona: {budgets}")
+        retry_stats = self.retry_policy.stats()
+        if retry_stats['retries'] or retry_stats['hedges']:
+            print(f"  API retries: {retry_stats['retries']}, hedged requests: {retry_stats['hedges']}")
         return results
     
-    def run_experiment(self, experiment_config: str = "configs/hyperparams.yaml"):
+    def export_batch(
+        self,
+        image_dir: str,
+        personas: Optional[List[str]] = None,
+        models: Optional[List[str]] = None,
+        output_path: str = "outputs/batch/batch_requests.jsonl"
+    ) -> str:
+        """
+        Export an image × persona × model sweep as an OpenAI batch-format JSONL file.
+        
+        Images are referenced by ``file://`` URL instead of being inlined, so
+        each painting is stored once however many requests use it. A manifest
+        (``<output>.manifest.json``) maps every ``custom_id`` back to its job
+        for ``ingest_batch``. The file can be run with vLLM's offline batch
+        runner, e.g. ``python -m vllm.entrypoints.openai.run_batch -i <file>
+        -o <results> --model <model> --allowed-local-media-path /``.
+        
+        Args:
+            image_dir: Directory containing painting images
+            personas: List of personas to use (None for baseline)
+            models: Model names to sweep (defaults to the configured model)
+            output_path: Batch request file to write
+        
+        Returns:
+            Path of the manifest file
+        """
+        from pathlib import Path
+        from datetime import datetime
+        
+        if personas is None:
+            personas = [None]
+        models = models or [self.config['model']['name']]
+        output_dir = os.path.dirname(output_path) or '.'
+        image_cache_dir = os.path.join(output_dir, "images")
+        os.makedirs(output_dir, exist_ok=True)
+        
+        model_config = self.config['model']
+        params = self.generation.to_request()
+        layout = model_config.get('prompt_layout', 'persona_first')
+        max_image_pixels = model_config.get('max_image_pixels')
+        
+        jobs = {}
+        image_files = self._list_images(image_dir)
+        with open(output_path, 'w', encoding='utf-8') as f:
+            for image_file in image_files:
+                image_path = os.path.join(image_dir, image_file)
+                eval_image = self._prepare_image(image_path, output_dir)
+                request_image = eval_image
+                if max_image_pixels:
+                    # Downscale once per painting; every request references the
+                    # copy, while prompts and critique files keep the original name
+                    downscaled = _downscale_image(eval_image, max_image_pixels)
+                    if downscaled is not None:
+                        image_bytes, mime_type = downscaled
+                        base_name = os.path.splitext(os.path.basename(eval_image))[0]
+                        extension = 'png' if mime_type == 'image/png' else 'jpg'
+                        request_image = os.path.join(image_cache_dir, f"{base_name}_{max_image_pixels}px.{extension}")
+                        os.makedirs(image_cache_dir, exist_ok=True)
+                        with open(request_image, 'wb') as image_out:
+                            image_out.write(image_bytes)
+                image_url = Path(os.path.abspath(request_image)).as_uri()
+                
+                for persona in personas:
+                    prompt = build_critique_prompt(
+                        eval_image,
+                        self.personas.get(persona, "") if persona else "",
+                        self.knowledge_base,
+                        self.retriever,
+                        persona,
+                        layout
+                    )
+                    for model_name in models:
+                        custom_id = JobJournal.job_id(image_path, persona, model_name)
+                        request = {
+                            'custom_id': custom_id,
+                            'method': 'POST',
+                            'url': '/v1/chat/completions',
+                            'body': build_chat_payload(
+                                model_name, prompt, image_url,
+                                image_first=layout == 'prefix_cache',
+                                **params
+                            )
+                        }
+                        f.write(json.dumps(request, ensure_ascii=False) + '\n')
+                        jobs[custom_id] = {
+                            'image_file': image_file,
+                            'image_path': image_path,
+                            'eval_image': eval_image,
+                            'persona': persona,
+                            'model': model_name
+                        }
+        
+        manifest_path = os.path.splitext(output_path)[0] + '.manifest.json'
+        with open(manifest_path, 'w', encoding='utf-8') as f:
+            json.dump({
+                'requests_file': output_path,
+                'created': datetime.now().isoformat(),
+                'jobs': jobs
+            }, f, ensure_ascii=False, indent=2)
+        
+        print(f"✓ Exported {len(jobs)} requests for {len(image_files)} images to: {output_path}")
+        print(f"  Manifest: {manifest_path}")
+        return manifest_path
+    
+    def ingest_batch(
+        self,
+        results_path: str,
+        manifest_path: str = "outputs/batch/batch_requests.manifest.json",
+        output_dir: str = "outputs/batch"
+    ) -> List[Dict[str, Any]]:
+        """
+        Turn batch runner output back into evaluation records.
+        
+        Each response becomes the same critique file and evaluation JSON as
+        an online evaluation and is recorded in ``journal.jsonl``. Requests
+        that failed or are missing from the output are written to
+        ``<requests>.retry.jsonl``; run that file through the batch runner and
+        ingest its output with the same manifest to complete the sweep.
+        
+        Args:
+            results_path: Batch output JSONL (one response per ``custom_id``)
+            manifest_path: Manifest written by ``export_batch``
+            output_dir: Directory to save outputs
+        
+        Returns:
+            List of evaluation results in export order
+        """
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+        jobs = manifest['jobs']
+        journal = JobJournal(os.path.join(output_dir, "journal.jsonl"), resume=True)
+        
+        results = {}
+        with open(results_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                entry = json.loads(line)
+                job = jobs.get(entry.get('custom_id'))
+                if job is None:
+                    print(f"✗ Unknown custom_id in batch output: {entry.get('custom_id')}")
+                    continue
+                
+                result = {
+                    'image_path': job['image_path'],
+                    'persona': job['persona'],
+                    'model': job['model'],
+                    'timestamp': None,
+                    'critique': None,
+                    'analysis': None,
+                    'error': None
+                }
+                response = entry.get('response') or {}
+                try:
+                    error = entry.get('error')
+                    if error or response.get('status_code', 200) != 200:
+                        if isinstance(error, dict):
+                            error = error.get('message', error)
+                        raise RuntimeError(error or f"HTTP {response.get('status_code')}")
+                    body = response.get('body') or {}
+                    result['critique'] = MLLMInterface.extract_text(body)
+                    usage = MLLMInterface.extract_usage(body)
+                    if any(v is not None for v in usage.values()):
+                        result['usage'] = usage
+                    save_critique(result['critique'], job['eval_image'], output_dir)
+                    result = self._finish_evaluation(result, output_dir)
+                except Exception as e:
+                    result['error'] = str(e)
+                    print(f"✗ Batch result failed for {job['image_file']}: {e}")
+                
+                result['image_file'] = job['image_file']
+                job_info = {'image_file': job['image_file'], 'persona': job['persona'], 'model': job['model']}
+                if result['error']:
+                    journal.record(entry['custom_id'], JobJournal.FAILED, error=result['error'], **job_info)
+                else:
+                    journal.record(entry['custom_id'], JobJournal.DONE, result=result, **job_info)
+                results[entry['custom_id']] = result
+        
+        # Results ingested from earlier (e.g. retry) batches count as well
+        ordered = []
+        for custom_id in jobs:
+            result = results.get(custom_id) or journal.result(custom_id)
+            if result is not None:
+                ordered.append(result)
+        summary_path = os.path.join(output_dir, "batch_summary.json")
+        with open(summary_path, 'w', encoding='utf-8') as f:
+            json.dump(ordered, f, ensure_ascii=False, indent=2)
+        
+        pending = {custom_id for custom_id in jobs if journal.status(custom_id) != JobJournal.DONE}
+        failed = sum(1 for r in results.values() if r['error'])
+        print(f"\n✓ Ingested {len(results) - failed} batch results into: {output_dir} "
+              f"({len(jobs) - len(pending)}/{len(jobs)} jobs complete)")
+        requests_file = manifest['requests_file']
+        retry_path = os.path.splitext(requests_file)[0] + '.retry.jsonl'
+        if pending:
+            with open(requests_file, 'r', encoding='utf-8') as f_in, \
+                    open(retry_path, 'w', encoding='utf-8') as f_out:
+                for line in f_in:
+                    if line.strip() and json.loads(line)['custom_id'] in pending:
+                        f_out.write(line)
+            print(f"  {len(pending)} requests failed or are missing; retry them with: {retry_path}")
+        elif os.path.exists(retry_path):
+            # Left over from an earlier ingest whose retries are now complete
+            os.remove(retry_path)
+        return ordered
+    
+    def run_experiment(
+        self,
+        experiment_config: str = "configs/hyperparams.yaml",
+        max_in_flight: Optional[int] = None,
+        resume: bool = False,
+        pipelined: Optional[bool] = None,
+        rate_limit: Optional[float] = None
+    ):
         """
         Run a complete experiment based on configuration file.
         
         Args:
             experiment_config: Path to experiment configuration
+            max_in_flight: Maximum concurrent MLLM requests (overrides config)
+            resume: Continue an interrupted run from its job journal
+            pipelined: Embed critiques while generation is still running
+                (defaults to ``analysis.pipelined`` in config)
+            rate_limit: Requests per second per endpoint (overrides
+                ``concurrency.rate_limits`` in either config)
         """
         with open(experiment_config, 'r', encoding='utf-8') as f:
             exp_config = yaml.safe_load(f)
@@ -219,19 +761,56 @@ class VULCA:
         print("Starting VULCA experiment...")
         print(f"Configuration: {experiment_config}")
         
+        # Request rates set by the experiment override the model config's
+        if rate_limit:
+            self.limit_request_rate(rate_limit)
+        else:
+            self._configure_rate_limits(exp_config.get('concurrency', {}).get('rate_limits') or {})
+        
+        analysis_enabled = exp_config.get('analysis', {}).get('enabled', False)
+        analysis_config = {**self.config.get('analysis', {}), **exp_config.get('analysis', {})}
+        embedding_model = analysis_config.get('embedding_model', 'BAAI/bge-large-zh-v1.5')
+        if pipelined is None:
+            pipelined = analysis_config.get('pipelined', False)
+        
+        analyzer = None
+        pipeline = None
+        if analysis_enabled:
+            from .analyze import SemanticAnalyzer, EmbeddingPipeline
+            analyzer = SemanticAnalyzer(
+                embedding_model,
+                store_path=analysis_config.get('embedding_store', DEFAULT_EMBEDDING_STORE)
+            )
+            if pipelined:
+                # Embed each critique as soon as it is generated
+                pipeline = EmbeddingPipeline(analyzer, analysis_config.get('pipeline_queue', 256))
+            elif analysis_config.get('warmup', True):
+                # Load the embedding model in the background while critiques are generated
+                warmup_embedding_model(embedding_model)
+        
         # Run batch evaluation
-        results = self.batch_evaluate(
-            image_dir=exp_config['data']['image_dir'],
-            personas=exp_config.get('personas', None),
-            output_dir=exp_config['output']['dir']
-        )
+        try:
+            results = self.batch_evaluate(
+                image_dir=exp_config['data']['image_dir'],
+                personas=exp_config.get('personas', None),
+                output_dir=exp_config['output']['dir'],
+                max_in_flight=max_in_flight or exp_config.get('concurrency', {}).get('max_in_flight'),
+                resume=resume,
+                on_result=(lambda result: pipeline.submit(result.get('critique'))) if pipeline else None
+            )
+        finally:
+            if pipeline:
+                pipeline.close()
+                print(f"✓ Embedded {pipeline.embedded} critiques during generation")
         
         # Run analysis if enabled
-        if exp_config.get('analysis', {}).get('enabled', False):
+        if analysis_enabled:
             from .analyze import run_full_analysis
             analysis_results = run_full_analysis(
                 results,
-                output_dir=exp_config['output']['dir']
+                output_dir=exp_config['output']['dir'],
+                analyzer=analyzer,
+                incremental=analysis_config.get('incremental', False)
             )
             print(f"✓ Analysis complete. Results in: {exp_config['output']['dir']}")
         
@@ -249,19 +828,75 @@ def main():
     parser.add_argument('--config', default='configs/default.yaml', help='Configuration file')
     parser.add_argument('--batch', help='Directory for batch processing')
     parser.add_argument('--experiment', help='Run full experiment from config')
+    parser.add_argument('--workers', type=int, help='Maximum concurrent MLLM requests in batch mode')
+    parser.add_argument('--rate-limit', type=float, help='Maximum requests per second to each API endpoint')
+    parser.add_argument('--prompt-layout', choices=['persona_first', 'prefix_cache'],
+                        help='Prompt order; prefix_cache shares image/instruction prefill across personas')
+    parser.add_argument('--max-tokens', type=int, help='Maximum tokens per critique (overrides config)')
+    parser.add_argument('--temperature', type=float, help='Sampling temperature (overrides config)')
+    parser.add_argument('--top-p', type=float, help='Nucleus sampling top_p (overrides config)')
+    parser.add_argument('--adaptive-tokens', action=argparse.BooleanOptionalAction, default=None,
+                        help='Cap max_tokens per persona from observed critique lengths (default: from config)')
+    parser.add_argument('--stream', action=argparse.BooleanOptionalAction, default=None,
+                        help='Stream responses and record TTFT / decode speed (default: from config)')
+    parser.add_argument('--idle-timeout', type=float,
+                        help='Streaming: seconds without new tokens before a request fails')
+    parser.add_argument('--cache', action=argparse.BooleanOptionalAction, default=None,
+                        help='Reuse cached critiques for identical inputs (default: from config)')
+    parser.add_argument('--resume', action='store_true',
+                        help='Resume an interrupted batch/experiment, skipping completed jobs')
+    parser.add_argument('--export-batch', metavar='JSONL',
+                        help='With --batch: write OpenAI batch requests instead of calling the API')
+    parser.add_argument('--models', nargs='+', help='Model names to sweep in --export-batch')
+    parser.add_argument('--ingest-batch', metavar='JSONL',
+                        help='Ingest batch runner output into evaluation records')
+    parser.add_argument('--manifest', default='outputs/batch/batch_requests.manifest.json',
+                        help='Manifest written by --export-batch (for --ingest-batch)')
+    parser.add_argument('--output', default='outputs/batch', help='Output directory for batch results')
+    parser.add_argument('--pipeline', action=argparse.BooleanOptionalAction, default=None,
+                        help='Embed critiques while the experiment is still generating them')
     
     args = parser.parse_args()
     
     # Initialize VULCA
-    vulca = VULCA(config_path=args.config)
+    vulca = VULCA(config_path=args.config, use_cache=args.cache)
+    if args.prompt_layout:
+        vulca.config['model']['prompt_layout'] = args.prompt_layout
+    vulca.generation = vulca.generation.replace(
+        max_tokens=args.max_tokens,
+        temperature=args.temperature,
+        top_p=args.top_p
+    )
+    if args.adaptive_tokens is not None:
+        vulca.config.setdefault('token_budget', {})['adaptive'] = args.adaptive_tokens
+        vulca.token_budget = vulca._build_token_budget()
+    if args.stream is not None:
+        vulca.config['model']['stream'] = args.stream
+    if args.idle_timeout:
+        vulca.config['model']['idle_timeout'] = args.idle_timeout
+    if args.rate_limit:
+        vulca.limit_request_rate(args.rate_limit)
     
     if args.experiment:
         # Run full experiment
-        vulca.run_experiment(args.experiment)
+        vulca.run_experiment(
+            args.experiment,
+            max_in_flight=args.workers,
+            resume=args.resume,
+            pipelined=args.pipeline,
+            rate_limit=args.rate_limit
+        )
+    elif args.ingest_batch:
+        # Offline batch results
+        vulca.ingest_batch(args.ingest_batch, args.manifest, args.output)
+    elif args.batch and args.export_batch:
+        # Offline batch requests
+        personas = [args.persona] if args.persona else None
+        vulca.export_batch(args.batch, personas, args.models, args.export_batch)
     elif args.batch:
         # Batch processing
         personas = [args.persona] if args.persona else None
-        vulca.batch_evaluate(args.batch, personas)
+        vulca.batch_evaluate(args.batch, personas, args.output, max_in_flight=args.workers, resume=args.resume)
     elif args.image:
         # Single image evaluation
         result = vulca.evaluate_painting(args.image, args.persona)